@@ -0,0 +1,358 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+"""
+Benchmark of the Python work done on every rerun, with the Streamlit component replaced by a stub.
+
+Times `detection()`, `segmentation()` and `annotation()` with the image already cached, and the helpers
+they rely on (`thumbnail_with_upscale`, bbox conversion, colormaps, mask serialization), over image sizes,
+bbox counts and mask counts. The stub returns a new value on every call, as after an edit in the frontend,
+so that decoding the value, patches, the store and sync groups are timed too. For the components, the size
+of the arguments sent to the frontend is reported as well. Results can be saved and compared against a baseline to catch regressions:
+
+    python benchmarks/hot_paths.py --json baseline.json
+    python benchmarks/hot_paths.py --compare baseline.json --threshold 1.25
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import numpy as np
+import streamlit as st
+from PIL import Image
+from image_pipeline import make_images, timed
+from streamlit_label_kit import AnnotationStore, convert_bbox_format, convert_bboxes, get_colormap
+from streamlit_label_kit.LabelToolKit import annotation as annotation_module
+from streamlit_label_kit.LabelToolKit import detection as detection_module
+from streamlit_label_kit.LabelToolKit import segmentation as segmentation_module
+from streamlit_label_kit.LabelToolKit import thumbnail_with_upscale
+from streamlit_label_kit.LabelToolKit.colormap import _get_colormap
+from streamlit_label_kit.LabelToolKit.mask import decode_masks, encode_masks
+
+SIZES = "256x256,1024x768,1920x1080,3840x2160,7680x4320"
+BOXES = "1,100,1000,10000,50000"
+MASKS = "1,10,100"
+LABELS = [f"label-{i}" for i in range(20)]
+PATCH_SLACK = 0.25e-3  # seconds
+
+
+class ComponentStub:
+    # Stands in for the Streamlit component, keeping the arguments of the last call. It returns the value
+    # the frontend would send after the first item was edited, with a new key on every call.
+    def __init__(self):
+        self.kwargs = {}
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.kwargs = kwargs
+        self.calls += 1
+        value = getattr(self, f"_{kwargs['label_type']}_value")(kwargs)
+        value["key"] = str(self.calls)
+        # Streamlit keeps the value in the session state, where sync groups read it in the next rerun
+        if kwargs.get("key") is not None:
+            st.session_state[kwargs["key"]] = value
+        return value
+
+    def _patch(self, kwargs, upserted: list) -> dict:
+        return {"base": kwargs["patch_base"], "revision": self.calls, "upserted": upserted, "deleted": [], "order": None}
+
+    def _annotation_value(self, kwargs) -> dict:
+        if kwargs["multi_select"]:
+            label = kwargs["default_multi_label_list"]
+        else:
+            index = kwargs["default_label_idx"]
+            label = kwargs["label_list"][index] if isinstance(index, int) else []
+        return {"label": label, "meta": kwargs["meta_info"]}
+
+    def _detection_value(self, kwargs) -> dict:
+        columns = kwargs["bbox_info"]
+        if kwargs["transfer_mode"] == "patch":
+            upserted = []
+            if columns["id"]:
+                # The first bbox, moved by a pixel
+                x, y, width, height = columns["bbox"][:4]
+                label_id = columns["label_id"][0]
+                upserted.append({
+                    "bbox": [x + 1, y, width, height],
+                    "label_id": label_id,
+                    "label": kwargs["label_list"][label_id],
+                    "id": columns["id"][0],
+                    "meta": columns["meta"].get(0, []),
+                    "additional_data": columns["additional_data"].get(0, {}),
+                })
+            return {"patch": self._patch(kwargs, upserted)}
+        # Index keys become strings in JSON
+        return {"bbox": {
+            **columns,
+            "meta": {str(i): meta for i, meta in columns["meta"].items()},
+            "additional_data": {str(i): info for i, info in columns["additional_data"].items()},
+        }}
+
+    def _segmentation_value(self, kwargs) -> dict:
+        label_list = kwargs["label_list"]
+        items = [
+            {
+                "data": info["data"],
+                "label_id": label_list.index(info["label"]),
+                "label": info["label"],
+                "id": info["id"],
+                "meta": info["meta"],
+                "additional_data": info["additional_data"],
+            }
+            for info in kwargs["masks_info"]
+        ]
+        if items:
+            # The first mask, redrawn as the last one
+            items[0] = {**items[0], "data": items[-1]["data"]}
+        if kwargs["transfer_mode"] == "patch":
+            return {"new": [], "patch": self._patch(kwargs, items[:1])}
+        return {"new": [], "mask": items}
+
+    def payload_bytes(self) -> int:
+        # Components send their arguments as JSON
+        return len(json.dumps(self.kwargs, default=lambda value: np.asarray(value).tolist()))
+
+
+def random_bboxes(count: int, size, rng) -> np.ndarray:
+    width, height = size
+    xy = rng.uniform(0, 0.9, (count, 2)) * (width, height)
+    wh = rng.uniform(0.01, 0.1, (count, 2)) * (width, height)
+    return np.hstack([xy, wh])
+
+
+def random_masks(count: int, size, rng) -> np.ndarray:
+    # Rectangles, so that RLE and packbits sizes resemble object masks rather than noise
+    width, height = size
+    masks = np.zeros((count, height, width), dtype=bool)
+    for mask, (x, y, w, h) in zip(masks, random_bboxes(count, size, rng).astype(int)):
+        mask[y:y + h, x:x + w] = True
+    return masks
+
+
+def display_size(size, target=(512, 512)):
+    ratio = min(target[0] / size[0], target[1] / size[1])
+    return (int(size[0] * ratio), int(size[1] * ratio))
+
+
+class Suite:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results = {}
+
+    def run(self, name: str, fn, stub: ComponentStub = None) -> None:
+        fn()  # warm up caches (image cache, colormaps, patch state)
+        seconds = timed(fn, self.repeat)
+        result = {"seconds": seconds}
+        if stub is not None:
+            result["payload_bytes"] = stub.payload_bytes()
+        self.results[name] = result
+
+        payload = f"{result['payload_bytes'] / 1024:12.1f} KiB" if stub is not None else ""
+        print(f"  {name:76s} {seconds * 1000:10.3f} ms{payload}")
+
+
+def bench_helpers(suite: Suite, sizes, box_counts, mask_counts, rng) -> None:
+    print("thumbnail_with_upscale to 512x512:")
+    for size in sizes:
+        image = Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+        suite.run(f"thumbnail_with_upscale[size={size[0]}x{size[1]}]", lambda: thumbnail_with_upscale(image, (512, 512)))
+
+    print("bbox conversion XYWH -> REL_CXYWH:")
+    for count in box_counts:
+        bboxes = random_bboxes(count, (1920, 1080), rng)
+        suite.run(f"convert_bboxes[boxes={count}]", lambda: convert_bboxes(bboxes, "XYWH", "REL_CXYWH", 1920, 1080))
+        if count <= 10000:
+            rows = bboxes.tolist()
+            suite.run(f"convert_bbox_format[boxes={count}]", lambda: [convert_bbox_format(b, "XYWH", "CXYWH") for b in rows])
+
+    print("colormap:")
+    for count in (10, 100, 1000):
+        labels = [f"label-{i}" for i in range(count)]
+        suite.run(f"get_colormap[labels={count}]", lambda: get_colormap(labels))
+        suite.run(f"get_colormap[labels={count},cold]", lambda: (_get_colormap.cache_clear(), get_colormap(labels)))
+
+    print("mask serialization at 512x288:")
+    for count in mask_counts:
+        masks = random_masks(count, (512, 288), rng)
+        for encoding in ("json", "rle", "packbits"):
+            suite.run(f"encode_masks[masks={count},encoding={encoding}]", lambda: encode_masks(masks, encoding))
+            encoded = encode_masks(masks, encoding)
+            suite.run(f"decode_masks[masks={count},encoding={encoding}]", lambda: decode_masks(encoded, 288, 512))
+
+
+def bench_components(suite: Suite, sizes, box_counts, mask_counts, rng, directory: str) -> None:
+    # Every case uses a component key and sync group of its own, so that no value carries over between cases
+    stub = ComponentStub()
+    for module in (detection_module, segmentation_module, annotation_module):
+        module._component_func = stub
+    store = AnnotationStore(os.path.join(directory, "annotations.db"))
+
+    paths = {}
+    for size in sizes:
+        path = make_images(directory, 1, size)[0]
+        paths[size] = os.path.join(directory, f"{size[0]}x{size[1]}.jpg")
+        os.replace(path, paths[size])
+
+    print("annotation():")
+    for size in sizes:
+        path = paths[size]
+        for case, case_args in (("", {}), (",store", {"store": store}), (",sync", {"sync_group": f"annotation-{size}"})):
+            name = f"annotation[size={size[0]}x{size[1]}{case}]"
+            suite.run(
+                name,
+                lambda: annotation_module.annotation(
+                    image_path=path, label_list=LABELS, label_index=1, classification=True, key=name, **case_args,
+                ),
+                stub,
+            )
+
+    print("detection():")
+    for size in sizes:
+        path = paths[size]
+        for count in box_counts:
+            bboxes = random_bboxes(count, size, rng)
+            labels = rng.integers(0, len(LABELS), count)
+            for case, case_args in (
+                ("transfer=full", {"labels": labels}),
+                ("transfer=full,return=columnar", {"labels": labels, "return_format": "columnar"}),
+                ("transfer=patch", {"labels": labels, "transfer_mode": "patch"}),
+                # Without labels, every bbox gets the default label
+                ("transfer=patch,labels=none", {"transfer_mode": "patch"}),
+                ("transfer=full,store", {"labels": labels, "store": store}),
+                ("transfer=full,sync", {"labels": labels, "sync_group": f"detection-{size}-{count}"}),
+            ):
+                name = f"detection[size={size[0]}x{size[1]},boxes={count},{case}]"
+                suite.run(
+                    name,
+                    lambda: detection_module.detection(
+                        image_path=path, label_list=LABELS, bboxes=bboxes, key=name, **case_args,
+                    ),
+                    stub,
+                )
+
+    print("segmentation():")
+    for size in sizes:
+        path = paths[size]
+        for count in mask_counts:
+            masks = random_masks(count, display_size(size), rng)
+            labels = [int(label) for label in rng.integers(0, len(LABELS), count)]
+            cases = [
+                *((f"encoding={encoding}", {"labels": labels, "mask_encoding": encoding}) for encoding in ("json", "rle", "packbits")),
+                ("encoding=rle,return=numpy", {"labels": labels, "mask_encoding": "rle", "return_format": "numpy"}),
+                ("encoding=rle,transfer=patch", {"labels": labels, "mask_encoding": "rle", "transfer_mode": "patch"}),
+                ("encoding=rle,transfer=patch,labels=none", {"mask_encoding": "rle", "transfer_mode": "patch"}),
+                ("encoding=rle,store", {"labels": labels, "mask_encoding": "rle", "store": store}),
+                ("encoding=rle,sync", {"labels": labels, "mask_encoding": "rle", "sync_group": f"segmentation-{size}-{count}"}),
+            ]
+            # Masks at original resolution are resampled to the display size and back
+            if count * size[0] * size[1] <= 2 ** 28:
+                cases.append((
+                    "encoding=rle,resolution=original",
+                    {"labels": labels, "mask_encoding": "rle", "mask_resolution": "original", "masks": random_masks(count, size, rng)},
+                ))
+            for case, case_args in cases:
+                name = f"segmentation[size={size[0]}x{size[1]},masks={count},{case}]"
+                suite.run(
+                    name,
+                    lambda: segmentation_module.segmentation(
+                        image_path=path, label_list=LABELS, key=name, **{"masks": masks, **case_args},
+                    ),
+                    stub,
+                )
+
+    store.close()
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric in ("seconds", "payload_bytes"):
+            if metric in result and before.get(metric) and result[metric] > before[metric] * threshold:
+                regressions.append(f"  {name} {metric}: {before[metric]:.6g} -> {result[metric]:.6g}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {threshold}x the baseline:")
+        print("\n".join(regressions))
+        return 1
+    print(f"\nNo regressions over {threshold}x the baseline")
+    return 0
+
+
+def check_patch_mode(results: dict, threshold: float) -> int:
+    # transfer_mode="patch" is meant to make a rerun cost scale with the edit, so it must not be slower
+    # than sending everything; the slack covers its fixed cost, which shows with a handful of items
+    slower = []
+    for name, result in results.items():
+        if "transfer=patch" not in name:
+            continue
+        full = results.get(name.replace("transfer=patch", "transfer=full")) or results.get(name.replace(",transfer=patch", ""))
+        if full is not None and result["seconds"] > full["seconds"] * threshold + PATCH_SLACK:
+            slower.append(f"  {name}: {result['seconds'] * 1000:.3f} ms, {full['seconds'] * 1000:.3f} ms in full mode")
+
+    if slower:
+        print(f"\n{len(slower)} cases slower in patch mode than in full mode:")
+        print("\n".join(slower))
+        return 1
+    return 0
+
+
+def parse_list(value: str, parse=int) -> list:
+    return [parse(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=SIZES, help="image sizes, WxH,...")
+    parser.add_argument("--boxes", default=BOXES, help="bbox counts")
+    parser.add_argument("--masks", default=MASKS, help="mask counts")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, the best is reported")
+    parser.add_argument("--only", choices=("helpers", "components"), help="run one group of benchmarks")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio to the baseline reported as a regression")
+    parser.add_argument(
+        "--patch-threshold", type=float, default=1.1, help="ratio to full mode reported as patch mode being slower"
+    )
+    args = parser.parse_args()
+
+    sizes = parse_list(args.sizes, lambda v: tuple(int(x) for x in v.split("x")))
+    box_counts = parse_list(args.boxes)
+    mask_counts = parse_list(args.masks)
+    rng = np.random.default_rng(0)
+
+    # Session state is used without a Streamlit server, which it warns about
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    Image.MAX_IMAGE_PIXELS = None
+
+    suite = Suite(args.repeat)
+    if args.only in (None, "helpers"):
+        bench_helpers(suite, sizes, box_counts, mask_counts, rng)
+    if args.only in (None, "components"):
+        with tempfile.TemporaryDirectory() as directory:
+            bench_components(suite, sizes, box_counts, mask_counts, rng, directory)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(suite.results, f, indent=1, sort_keys=True)
+    status = check_patch_mode(suite.results, args.patch_threshold)
+    if args.compare:
+        status = max(status, compare(suite.results, args.compare, args.threshold))
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
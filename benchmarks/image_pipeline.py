@@ -0,0 +1,95 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+"""
+Benchmark of the image loading pipeline on large JPEGs.
+
+Compares the original pipeline (full decode, LANCZOS resize of the full image, PNG encode)
+with reduced JPEG decoding and two-stage resizing, and preloading many images sequentially
+against thread and process pools.
+
+    python benchmarks/image_pipeline.py --count 16 --size 6000x4000 --target 512x512
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+from streamlit_label_kit.LabelToolKit.image_cache import ImageCache, load_image, preload_images
+
+
+def make_images(directory: str, count: int, size, seed: int = 0) -> list:
+    # Smooth gradients plus noise, so that JPEG sizes and decode times resemble photos
+    rng = np.random.default_rng(seed)
+    width, height = size
+    gradient = np.add.outer(np.linspace(0, 127, height), np.linspace(0, 127, width))
+    paths = []
+    for i in range(count):
+        noise = rng.normal(0, 20, (height, width, 3))
+        pixels = (gradient[..., None] + noise + i * 3).clip(0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"image-{i}.jpg")
+        Image.fromarray(pixels).save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def original_pipeline(path: str, target) -> bytes:
+    with Image.open(path) as image:
+        ratio = min(target[0] / image.width, target[1] / image.height)
+        resized = image.resize((int(image.width * ratio), int(image.height * ratio)), Image.LANCZOS)
+    buffer = io.BytesIO()
+    resized.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def timed(fn, repeat: int = 1) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=8, help="number of images to preload")
+    parser.add_argument("--size", default="6000x4000", help="source image size, WxH")
+    parser.add_argument("--target", default="512x512", help="display size, WxH")
+    parser.add_argument("--workers", type=int, default=None, help="pool size for preloading")
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.split("x"))
+    target = tuple(int(v) for v in args.target.split("x"))
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_images(directory, args.count, size)
+        path = paths[0]
+
+        print(f"Single {size[0]}x{size[1]} JPEG shown at {target[0]}x{target[1]} (best of 3):")
+        baseline = timed(lambda: original_pipeline(path, target), 3)
+        print(f"  {'full decode + LANCZOS + PNG':40s} {baseline * 1000:8.1f} ms")
+        for image_format in ("png", "auto"):
+            elapsed = timed(lambda: load_image(path, *target, image_format=image_format, cache=ImageCache()), 3)
+            label = f"draft + reduce/LANCZOS + {image_format}"
+            print(f"  {label:40s} {elapsed * 1000:8.1f} ms  {baseline / elapsed:5.1f}x")
+
+        print(f"\nPreloading {args.count} images (image_format='auto'):")
+        sequential = timed(lambda: [load_image(p, *target, cache=ImageCache()) for p in paths])
+        print(f"  {'sequential load_image':40s} {sequential * 1000:8.1f} ms")
+        for label, use_processes in (("preload_images, threads", False), ("preload_images, processes", True)):
+            elapsed = timed(lambda: preload_images(
+                paths, *target, max_workers=args.workers, use_processes=use_processes, cache=ImageCache()
+            ))
+            print(f"  {label:40s} {elapsed * 1000:8.1f} ms  {sequential / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
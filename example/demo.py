@@ -259,41 +259,20 @@ with mode[0]:
     with st.expander("two-synchronized Example"):
         
         with st.echo():
-            if "result_dup" not in st.session_state:
-                st.session_state.result_dup = []
-                
-            if "result_dup_out1" not in st.session_state:
-                st.session_state.result_dup_out1 = {"key": "0", "bbox": []}
-                
-            if "result_dup_out2" not in st.session_state:
-                st.session_state.result_dup_out2 = {"key": "0", "bbox": []}
-                
-            data = st.session_state.result_dup or []
-                                    
-            bboxes = [item['bboxes'] for item in data]
-            bbox_ids = [item['bbox_ids'] for item in data]
-            labels = [item['labels'] for item in data]
-            meta_data = [item['meta_data'] for item in data]
-            info_dict = [item['info_dict'] for item in data]
-            
+            # Both views share one state: an edit in either is shown by both in the same rerun
             c1, c2 = st.columns(2)
             with c1: 
                 test_out1 = detection(
                     image_path=target_image_path,
-                    bboxes=bboxes,
-                    bbox_ids=bbox_ids,
                     bbox_format=st.session_state.out["bbox_format"],
-                    labels=labels,
-                    info_dict=info_dict,
-                    meta_data=meta_data,
                     label_list=_label_list,
                     line_width=_line_width,
                     class_select_type=_class_select_type,
                     ui_position="left",
                     item_editor=True,
-                    # item_selector=True,
                     edit_meta=True,
                     bbox_show_label=True,
+                    sync_group="detection_dup",
                     key="detection_dup1"
                 )
                 test_out1
@@ -301,40 +280,19 @@ with mode[0]:
             with c2:
                 test_out2 = detection(
                     image_path=target_image_path,
-                    bboxes=bboxes,
-                    bbox_ids=bbox_ids,
                     bbox_format=st.session_state.out["bbox_format"],
-                    labels=labels,
-                    info_dict=info_dict,
-                    meta_data=meta_data,
                     label_list=_label_list,
                     line_width=_line_width,
                     class_select_type=_class_select_type,
                     ui_position="right",
-                    # item_editor=True,
                     item_selector=True,
                     edit_meta=True,
                     bbox_show_label=True,
+                    sync_group="detection_dup",
                     key="detection_dup2"
                 )
                 test_out2
             
-            if (test_out1["key"] != st.session_state.result_dup_out1["key"] or test_out2["key"] != st.session_state.result_dup_out2["key"]):
-                if test_out1["key"] != st.session_state.result_dup_out1["key"]:
-                    st.session_state.result_dup_out1["key"] = test_out1["key"]
-                    st.session_state.result_dup_out1["bbox"] = test_out1["bbox"]
-                if test_out2["key"] != st.session_state.result_dup_out2["key"]:
-                    st.session_state.result_dup_out2["key"] = test_out2["key"]
-                    st.session_state.result_dup_out2["bbox"] = test_out2["bbox"]
-                
-                
-                if st.session_state.result_dup_out2["key"] > st.session_state.result_dup_out1["key"]:  
-                    st.session_state.result_dup = st.session_state.result_dup_out2["bbox"]
-                else:
-                    st.session_state.result_dup = st.session_state.result_dup_out1["bbox"]
-                
-                st.rerun()
-            
     with st.expander("self-synchronized Example"):
         with st.echo():
             if "self_sync" not in st.session_state:
@@ -546,68 +504,35 @@ with mode[1]: # Classification
     with st.expander("two-synchronized Example"):
         
         with st.echo():
-            if "class_dup" not in st.session_state:
-                st.session_state.class_dup = []
-                
-            if "class_dup_out1" not in st.session_state:
-                st.session_state.class_dup_out1 = {"key": "0", "label": "", "meta": []}
-                
-            if "class_dup_out2" not in st.session_state:
-                st.session_state.class_dup_out2 = {"key": "0", "label": "", "meta": []}
-                
-            _label = st.session_state.class_dup or {"key": "0", "label": "", "meta": []}
-                       
-            try:
-                index = _label_list.index(_label["label"])
-            except ValueError:
-                index = 0        
-            label_index = index
-            meta_data = _label["meta"]
-            
+            # Both views share one state: an edit in either is shown by both in the same rerun
             c1, c2 = st.columns(2)
             with c1: 
                 class_out1 = annotation(
                     image_path=image_path_list[num_page] if _use_image else None,
                     label_list=_label_list,
-                    label_index=label_index,
-                    meta_data=meta_data,
                     image_height=_height,
                     image_width=_width,
                     classification=True,
                     class_select_type = _class_select_type,
                     meta_editor = True,
+                    sync_group="class_dup",
                     key="class_dup1",
-                ) or {"key": "0", "label": "", "meta": []}
+                )
                 class_out1
             
             with c2:
                 class_out2 = annotation(
                     image_path=image_path_list[num_page] if _use_image else None,
                     label_list=_label_list,
-                    label_index=label_index,
-                    meta_data=meta_data,
                     image_height=_height,
                     image_width=_width,
                     classification=True,
                     class_select_type = _class_select_type,
                     meta_editor = True,
+                    sync_group="class_dup",
                     key="class_dup2",
-                ) or {"key": "0", "label": "", "meta": []}
+                )
                 class_out2
-            
-                    
-            if (class_out1["key"] != st.session_state.class_dup_out1["key"] or class_out2["key"] != st.session_state.class_dup_out2["key"]):
-                if class_out1["key"] != st.session_state.class_dup_out1["key"]:
-                    st.session_state.class_dup_out1 = class_out1
-                if class_out2["key"] != st.session_state.class_dup_out2["key"]:
-                    st.session_state.class_dup_out2 = class_out2
-                
-                if st.session_state.class_dup_out2["key"] > st.session_state.class_dup_out1["key"]:  
-                    st.session_state.class_dup = st.session_state.class_dup_out2
-                else:
-                    st.session_state.class_dup = st.session_state.class_dup_out1
-                
-                st.rerun()
                 
         st.write('''
             #WARNNING:\n
@@ -808,69 +733,29 @@ with mode[2]: #Segmentation
     with st.expander("two-synchronized Example"):
         
         with st.echo():
-            if "seg_dup" not in st.session_state:
-                st.session_state.seg_dup = []
-                
-            if "seg_dup_out1" not in st.session_state:
-                st.session_state.seg_dup_out1 = {"key": "0", "mask": []}
-                
-            if "seg_dup_out2" not in st.session_state:
-                st.session_state.seg_dup_out2 = {"key": "0", "mask": []}
-                
-            data = st.session_state.seg_dup or []
-                       
-            masks = [item['masks'] for item in data]
-            mask_ids = [item['mask_ids'] for item in data]
-            labels = [item['labels'] for item in data]
-            meta_data = [item['meta_data'] for item in data]
-            info_dict = [item['info_dict'] for item in data]
-            
+            # Both views share one state: an edit in either is shown by both in the same rerun
             c1, c2 = st.columns(2)
             with c1: 
                 seg_out1 = segmentation(
                     image_path=target_image_path,
                     bbox_format=_bbox_format,
-                    masks=masks,
-                    mask_ids=mask_ids,
-                    labels=labels,
-                    meta_data=meta_data,
                     label_list=_label_list,
                     item_editor=True,
-                    # item_selector=False,
                     edit_meta=True,
+                    sync_group="seg_dup",
                     key="seg_dup1",
                 )
-                # seg_out1
             
             with c2:
                 seg_out2 = segmentation(
                     image_path=target_image_path,
                     bbox_format=_bbox_format,
-                    masks=masks,
-                    mask_ids=mask_ids,
-                    labels=labels,
                     ui_position="right",
-                    meta_data=meta_data,
                     label_list=_label_list,
                     item_editor=True,
                     item_selector=True,
                     edit_meta=True,
+                    sync_group="seg_dup",
                     key="seg_dup2",
                 )
-                # seg_out2
-            
-                    
-            if (seg_out1["key"] != st.session_state.seg_dup_out1["key"] or seg_out2["key"] != st.session_state.seg_dup_out2["key"]):
-
-                if seg_out1["key"] != st.session_state.seg_dup_out1["key"]:
-                    st.session_state.seg_dup_out1 = seg_out1
-                if seg_out2["key"] != st.session_state.seg_dup_out2["key"]:
-                    st.session_state.seg_dup_out2 = seg_out2
-                
-                if st.session_state.seg_dup_out2["key"] > st.session_state.seg_dup_out1["key"]:  
-                    st.session_state.seg_dup = st.session_state.seg_dup_out2["mask"]
-                else:
-                    st.session_state.seg_dup = st.session_state.seg_dup_out1["mask"]
-                
-                st.rerun()
                 
\ No newline at end of file
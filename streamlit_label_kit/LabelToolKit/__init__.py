@@ -7,8 +7,9 @@
 
 from pathlib import Path
 
+import numpy as np
 import streamlit.components.v1 as components
-from typing import Literal, Tuple
+from typing import Literal, Optional, Tuple
 from PIL import Image
 
 
@@ -98,13 +99,110 @@ def absolute_to_relative(
     rx2, ry2 = ax2 / image_width, ay2 / image_height
     return (rx1, ry1, rx2, ry2)
 
-def thumbnail_with_upscale(image: Image, size : Tuple[int, int]) -> Image:
+BBoxFormat = Literal["XYWH", "XYXY", "CXYWH", "REL_XYWH", "REL_XYXY", "REL_CXYWH"]
+
+
+def relative_to_absolute_bboxes(bboxes, image_width: int, image_height: int) -> np.ndarray:
+    """
+    Convert an (N, 4) array of relative bbox coordinates to absolute pixel coordinates.
+
+    Columns 0 and 2 are scaled by `image_width`, columns 1 and 3 by `image_height`, so this
+    applies to every bbox format.
+
+    Args:
+    bboxes (np.ndarray or List): (N, 4) bounding boxes in relative coordinates.
+    image_width (int): The width of the image in pixels.
+    image_height (int): The height of the image in pixels.
+
+    Returns:
+    np.ndarray: (N, 4) float array of bounding boxes in absolute pixel coordinates.
+    """
+    return np.asarray(bboxes, dtype=float).reshape(-1, 4) * (image_width, image_height, image_width, image_height)
+
+
+def absolute_to_relative_bboxes(bboxes, image_width: int, image_height: int) -> np.ndarray:
+    """
+    Convert an (N, 4) array of absolute pixel bbox coordinates to relative coordinates.
+
+    Args:
+    bboxes (np.ndarray or List): (N, 4) bounding boxes in absolute pixel coordinates.
+    image_width (int): The width of the image in pixels.
+    image_height (int): The height of the image in pixels.
+
+    Returns:
+    np.ndarray: (N, 4) float array of bounding boxes in relative coordinates.
+    """
+    return np.asarray(bboxes, dtype=float).reshape(-1, 4) / (image_width, image_height, image_width, image_height)
+
+
+def convert_bboxes(
+    bboxes,
+    input_format: BBoxFormat,
+    output_format: BBoxFormat,
+    image_width: int = None,
+    image_height: int = None,
+) -> np.ndarray:
+    """
+    Convert an (N, 4) array of bounding boxes between any two formats, including the relative (REL_*) ones.
+
+    Args:
+    bboxes (np.ndarray or List): (N, 4) bounding boxes in `input_format`.
+    input_format (str): The format of the input bounding boxes.
+    output_format (str): The format to convert the bounding boxes to.
+    image_width (int, optional): The width of the image in pixels, required if either format is relative.
+    image_height (int, optional): The height of the image in pixels, required if either format is relative.
+
+    Returns:
+    np.ndarray: (N, 4) float array of bounding boxes in the new format.
+    """
+    bboxes = np.array(bboxes, dtype=float).reshape(-1, 4)
+    if input_format == output_format:
+        return bboxes
+
+    input_relative = input_format.startswith("REL_")
+    output_relative = output_format.startswith("REL_")
+    if (input_relative or output_relative) and (image_width is None or image_height is None):
+        raise ValueError(f"image_width and image_height are required to convert from {input_format} to {output_format}")
+
+    if input_relative:
+        bboxes = relative_to_absolute_bboxes(bboxes, image_width, image_height)
+    xy, wh = _bboxes_to_xywh(bboxes, input_format.replace("REL_", ""))
+    bboxes = _bboxes_from_xywh(xy, wh, output_format.replace("REL_", ""))
+    if output_relative:
+        bboxes = absolute_to_relative_bboxes(bboxes, image_width, image_height)
+    return bboxes
+
+
+def _bboxes_to_xywh(bboxes: np.ndarray, bbox_format: str) -> Tuple[np.ndarray, np.ndarray]:
+    if bbox_format == "XYWH":
+        return bboxes[:, :2], bboxes[:, 2:]
+    if bbox_format == "XYXY":
+        return bboxes[:, :2], bboxes[:, 2:] - bboxes[:, :2]
+    if bbox_format == "CXYWH":
+        return bboxes[:, :2] - bboxes[:, 2:] / 2, bboxes[:, 2:]
+    raise ValueError(f"Unknown bbox format: {bbox_format!r}")
+
+
+def _bboxes_from_xywh(xy: np.ndarray, wh: np.ndarray, bbox_format: str) -> np.ndarray:
+    if bbox_format == "XYWH":
+        return np.concatenate((xy, wh), axis=1)
+    if bbox_format == "XYXY":
+        return np.concatenate((xy, xy + wh), axis=1)
+    if bbox_format == "CXYWH":
+        return np.concatenate((xy + wh / 2, wh), axis=1)
+    raise ValueError(f"Unknown bbox format: {bbox_format!r}")
+
+
+def thumbnail_with_upscale(image: Image, size : Tuple[int, int], reducing_gap: Optional[float] = 2.0) -> Image:
     """
     Imitates PIL's image.thumbnail function, but supports upscaling while preserving aspect ratio
 
     Args:
     image (PIL.Image): The image to be resized
     size (Tuple[int, int]): The desired target size (width, height)
+    reducing_gap (float, optional): When downscaling by more than this factor, first reduce the image by an integer
+        factor with a fast box filter, then resample the rest with LANCZOS, as in PIL's image.thumbnail.
+        None always resamples the full image.
 
     Returns:
     PIL.Image: The resized image
@@ -121,4 +219,4 @@ def thumbnail_with_upscale(image: Image, size : Tuple[int, int]) -> Image:
         new_height = target_height
         new_width = int(target_height * aspect_ratio)
 
-    return image.resize((new_width, new_height), Image.LANCZOS)
\ No newline at end of file
+    return image.resize((new_width, new_height), Image.LANCZOS, reducing_gap=reducing_gap)
\ No newline at end of file
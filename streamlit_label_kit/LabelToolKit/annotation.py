@@ -6,24 +6,16 @@
 #
 
 from __future__ import annotations
-from hashlib import md5
 from typing import Literal, Union, List
-import matplotlib.pyplot as plt
-import numpy as np
-import streamlit.elements.image as st_image
-from PIL import Image
 from streamlit.components.v1.components import CustomComponent
-from . import _component_func, thumbnail_with_upscale
+from . import _component_func
+from .colormap import get_colormap
+from .image_cache import ImageIdentity, load_image, get_image_url
+from .patch import input_digest
+from .store import AnnotationStore, _store_value, record_id
+from .sync import join_sync_group
 
 
-def get_colormap(label_names, colormap_name="gist_rainbow"):
-    colormap = {}
-    cmap = plt.get_cmap(colormap_name)
-    for idx, l in enumerate(label_names):
-        rgb = [int(d) for d in np.array(cmap(float(idx) / len(label_names))) * 255][:3]
-        colormap[l] = "#%02x%02x%02x" % tuple(rgb)
-    return colormap
-
 SELECT_HEIGHT = 60
 RADIO_HEGIHT = 34
 UI_HEIGHT = 34
@@ -71,12 +63,21 @@ def annotation(
     ui_height: int = None,
     read_only: bool = False,
     component_alignment: Literal["left", "center", "right"] = "left",
+    commit_mode: Literal["immediate", "debounce", "explicit"] = "immediate",
+    commit_delay: int = 500,
+    image=None,
+    image_id: str = None,
+    image_identity: ImageIdentity = "stat",
+    image_format: Literal["auto", "png", "jpeg", "webp"] = "auto",
+    image_quality: int = 85,
+    store: AnnotationStore = None,
+    sync_group: str = None,
     key=None,
 ) -> CustomComponent:
     """
     Provides a user interface for annotating images, enabling the interactive assignment of labels/classes
     or editing of metadata/descriptions. This function can also be used to display only the UI components without
-    an image by omitting the `image_path` parameter.
+    an image by omitting both the `image_path` and `image` parameters.
 
     Args:
         image_path (str, optional): Path to the image file. If not provided, no image is displayed.
@@ -101,6 +102,15 @@ def annotation(
         ui_height (int, optional): Custom height for the UI components.
         read_only (bool, optional): If True, disables any interactions, making the UI read-only.
         component_alignment (Literal["left", "center", "right"], optional): Alignment of the UI components.
+        commit_mode (Literal["immediate", "debounce", "explicit"], optional): When edits are sent back to Python (each causing a rerun): "immediate" sends every edit; "debounce" sends the latest state once no edit was made for `commit_delay` ms; "explicit" only sends it on the Save button or Ctrl/Cmd+S. Until then, the frontend keeps its local state.
+        commit_delay (int, optional): Idle time in milliseconds before edits are sent with commit_mode="debounce".
+        image (Union[PIL.Image.Image, np.ndarray, bytes, BinaryIO], optional): The image in memory instead of a file: a PIL Image, an HxW or HxWxC uint8 array, or encoded image bytes or a file object. Takes precedence over `image_path`; identified by a CRC32 of its bytes or pixels unless `image_id` is given.
+        image_id (str, optional): Caller-supplied content id of the image (e.g. a dataset hash), used to cache and name the served image.
+        image_identity (Union[Literal["stat", "content"], Callable], optional): How the image is identified when `image_id` is not given: "stat" (path, inode, mtime, size), "content" (CRC32 of the file bytes) or a callable returning an id for the image (path or image in memory).
+        image_format (Literal["auto", "png", "jpeg", "webp"], optional): Format the displayed image is sent in. "auto" keeps images with transparency or at most 256 colors (masks, overlays, drawings) lossless as PNG and sends photos as JPEG.
+        image_quality (int, optional): JPEG/WebP quality (1-100) of the displayed image, ignored for PNG.
+        store (AnnotationStore, optional): Persistent store the initial label and metadata are read from when neither `label_index` nor `meta_data` is given, and every new returned value is written to. Records are stored under `image_id`, else the image path, else the identity of the image in memory; without an image, `image_id` is required.
+        sync_group (str, optional): Name of a group of linked annotation components in the session. An edit in any of them is shown by all in the same rerun, and all return the shared state with its `revision`. Until the first edit, or when their inputs change, each shows its inputs. Requires `key`.
         key (any, optional): A unique key to differentiate this instance when using multiple components.
 
     Returns:
@@ -111,18 +121,46 @@ def annotation(
             'label': str,   # Name of the selected label.
             'meta': [str],  # List of metadata strings associated with the annotation.
             'key': key,     # Unique identifier for the returned value.
+            'revision': int, # With sync_group: number of edits to the shared state.
         }
     """
 
 
     #WARNNING: If you are "inputing" data to "annotation", always provide appropriate value to the "meta_data" argument
     
-    if (image_path):
-        image = Image.open(image_path)
-        image = thumbnail_with_upscale(image, (image_width, image_height))
+    if image is None:
+        image = image_path
+    if image is not None:
+        cached = load_image(image, image_width, image_height, image_id, image_identity, image_format, image_quality)
     
     if (not classification and not meta_editor):
         return None
+
+    def _record_inputs(record):
+        # label_index and meta_data of a record
+        labels = record["label"] if isinstance(record["label"], list) else [record["label"]]
+        label_indices = [label_list.index(label) for label in labels if label in label_list]
+        return (label_indices if multi_select else next(iter(label_indices), None)), list(record["meta"])
+
+    # Resume from the store when no label or metadata is given
+    if store is not None:
+        store_id = record_id(image, image_id, cached.digest if image is not None else None)
+        if store_id is None:
+            raise ValueError("annotation() requires an image or an image_id to use a store")
+        record = store.get(store_id, "annotation") if label_index is None and not meta_data else None
+        if record is not None:
+            label_index, meta_data = _record_inputs(record)
+
+    # Linked components show the latest edit made in any of them
+    group = None
+    if sync_group is not None:
+        group = join_sync_group(
+            sync_group, "annotation", key,
+            input_digest(cached.digest if image is not None else None, label_index, meta_data),
+            lambda value: {"label": value["label"], "meta": value["meta"]},
+        )
+        if group.record is not None:
+            label_index, meta_data = _record_inputs(group.record)
     
     _class_select_pos = class_select_position or ui_position
     _meta_editor_pos = meta_editor_position or ui_position
@@ -135,23 +173,14 @@ def annotation(
 
     _select_type = "radio" if class_select_type != "select" else "select"
 
-    if image_path == None:
+    if image is None:
         _image_url = ""
         _default_label_list = []
         _image_size = [0,0]
 
     else:
-        _image_url = st_image.image_to_url(
-            image,
-            image.size[0],
-            True,
-            "RGB",
-            "PNG",
-            f"annotation-{md5(image.tobytes()).hexdigest()}-{key}",
-        )
-        _image_size = image.size
-        if _image_url.startswith("/"):
-            _image_url = _image_url[1:]
+        _image_url = get_image_url(cached, "annotation", key)
+        _image_size = cached.image.size
             
         if multi_select and isinstance(label_index, list):
             _default_label_list = [label_list[i] for i in label_index]
@@ -197,17 +226,35 @@ def annotation(
         
         default_multi_label_list=_default_label_list,
         justify_content=_justify_content,
-        label_type="annotation"
+        label_type="annotation",
+        commit_mode=commit_mode,
+        commit_delay=commit_delay,
     )
     
+    component_key = key
     key = 0
     label = []
     meta = []
-    if component_value:
+    if group is not None:
+        # Linked components return the state they show
+        key = group.key
+        if group.record is not None:
+            label, meta = group.record["label"], group.record["meta"]
+        else:
+            indices = label_index if isinstance(label_index, list) else [] if label_index is None else [label_index]
+            names = [label_list[i] for i in indices]
+            label = names if multi_select else next(iter(names), [])
+            meta = meta_data
+    elif component_value:
         label = component_value["label"]
         key = int(component_value["key"])
         meta = component_value["meta"]
     result = {"label": label, "meta": meta, "key": key}
+    if group is not None:
+        result["revision"] = group.revision
+
+    if store is not None:
+        _store_value(store, "annotation", store_id, key, lambda: {"label": label, "meta": meta}, component_key)
         
     
     return result
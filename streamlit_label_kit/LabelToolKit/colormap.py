@@ -0,0 +1,178 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+from __future__ import annotations
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple
+import numpy as np
+
+
+# Segment data as defined by matplotlib: per channel, rows of (x, y0, y1)
+def _from_list(colors):
+    return {
+        channel: tuple((x, color[i], color[i]) for x, color in colors)
+        for i, channel in enumerate(("red", "green", "blue"))
+    }
+
+
+_GIST_RAINBOW_DATA = _from_list((
+    (0.000, (1.00, 0.00, 0.16)),
+    (0.030, (1.00, 0.00, 0.00)),
+    (0.215, (1.00, 1.00, 0.00)),
+    (0.400, (0.00, 1.00, 0.00)),
+    (0.586, (0.00, 1.00, 1.00)),
+    (0.770, (0.00, 0.00, 1.00)),
+    (0.954, (1.00, 0.00, 1.00)),
+    (1.000, (1.00, 0.00, 0.75)),
+))
+
+_HSV_DATA = {
+    "red": ((0., 1., 1.),
+            (0.158730, 1.000000, 1.000000),
+            (0.174603, 0.968750, 0.968750),
+            (0.333333, 0.031250, 0.031250),
+            (0.349206, 0.000000, 0.000000),
+            (0.666667, 0.000000, 0.000000),
+            (0.682540, 0.031250, 0.031250),
+            (0.841270, 0.968750, 0.968750),
+            (0.857143, 1.000000, 1.000000),
+            (1.0, 1.0, 1.0)),
+    "green": ((0., 0., 0.),
+              (0.158730, 0.937500, 0.937500),
+              (0.174603, 1.000000, 1.000000),
+              (0.507937, 1.000000, 1.000000),
+              (0.666667, 0.062500, 0.062500),
+              (0.682540, 0.000000, 0.000000),
+              (1.0, 0., 0.)),
+    "blue": ((0., 0., 0.),
+             (0.333333, 0.000000, 0.000000),
+             (0.349206, 0.062500, 0.062500),
+             (0.507937, 1.000000, 1.000000),
+             (0.841270, 1.000000, 1.000000),
+             (0.857143, 0.937500, 0.937500),
+             (1.0, 0.09375, 0.09375)),
+}
+
+_JET_DATA = {
+    "red": ((0.00, 0, 0),
+            (0.35, 0, 0),
+            (0.66, 1, 1),
+            (0.89, 1, 1),
+            (1.00, 0.5, 0.5)),
+    "green": ((0.000, 0, 0),
+              (0.125, 0, 0),
+              (0.375, 1, 1),
+              (0.640, 1, 1),
+              (0.910, 0, 0),
+              (1.000, 0, 0)),
+    "blue": ((0.00, 0.5, 0.5),
+             (0.11, 1, 1),
+             (0.34, 1, 1),
+             (0.65, 0, 0),
+             (1.00, 0, 0)),
+}
+
+_TAB10_DATA = (
+    "1f77b4", "ff7f0e", "2ca02c", "d62728", "9467bd",
+    "8c564b", "e377c2", "7f7f7f", "bcbd22", "17becf",
+)
+
+_TAB20_DATA = (
+    "1f77b4", "aec7e8", "ff7f0e", "ffbb78", "2ca02c",
+    "98df8a", "d62728", "ff9896", "9467bd", "c5b0d5",
+    "8c564b", "c49c94", "e377c2", "f7b6d2", "7f7f7f",
+    "c7c7c7", "bcbd22", "dbdb8d", "17becf", "9edae5",
+)
+
+_SEGMENTED_PALETTES = {
+    "gist_rainbow": _GIST_RAINBOW_DATA,
+    "hsv": _HSV_DATA,
+    "jet": _JET_DATA,
+}
+
+_LISTED_PALETTES = {
+    "tab10": _TAB10_DATA,
+    "tab20": _TAB20_DATA,
+}
+
+PALETTES = tuple(_SEGMENTED_PALETTES) + tuple(_LISTED_PALETTES)
+
+
+def _segment_lookup_table(N: int, data) -> np.ndarray:
+    # Same interpolation as matplotlib.colors._create_lookup_table (gamma = 1)
+    adata = np.array(data, dtype=float)
+    x = adata[:, 0] * (N - 1)
+    y0 = adata[:, 1]
+    y1 = adata[:, 2]
+    xind = (N - 1) * np.linspace(0, 1, N)
+    ind = np.searchsorted(x, xind)[1:-1]
+
+    distance = (xind[1:-1] - x[ind - 1]) / (x[ind] - x[ind - 1])
+    lut = np.concatenate([
+        [y1[0]],
+        distance * (y0[ind] - y1[ind - 1]) + y1[ind - 1],
+        [y0[-1]],
+    ])
+    return np.clip(lut, 0.0, 1.0)
+
+
+@lru_cache(maxsize=None)
+def _palette_lut(palette: str) -> np.ndarray:
+    if palette in _SEGMENTED_PALETTES:
+        data = _SEGMENTED_PALETTES[palette]
+        return np.stack([_segment_lookup_table(256, data[c]) for c in ("red", "green", "blue")], axis=1)
+
+    if palette in _LISTED_PALETTES:
+        return np.array([
+            [int(color[i:i + 2], 16) / 255 for i in (0, 2, 4)]
+            for color in _LISTED_PALETTES[palette]
+        ])
+
+    # Anything else is looked up in matplotlib, imported only when needed
+    try:
+        from matplotlib import colormaps
+        cmap = colormaps[palette]
+    except ImportError:
+        try:
+            from matplotlib.cm import get_cmap
+        except ImportError:
+            raise ValueError(
+                f"Unknown colormap {palette!r}; install matplotlib to use colormaps other than {', '.join(PALETTES)}"
+            ) from None
+        cmap = get_cmap(palette)
+    return np.array(cmap(np.arange(cmap.N)))[:, :3]
+
+
+@lru_cache(maxsize=256)
+def _get_colormap(label_names: Tuple[str, ...], colormap_name: str) -> Tuple[Tuple[str, str], ...]:
+    lut = _palette_lut(colormap_name)
+    N = len(lut)
+    colors = []
+    for idx, l in enumerate(label_names):
+        # Sample the colormap the way matplotlib does for a float in [0, 1)
+        i = min(int(float(idx) / len(label_names) * N), N - 1)
+        rgb = [int(d) for d in lut[i] * 255]
+        colors.append((l, "#%02x%02x%02x" % tuple(rgb)))
+    return tuple(colors)
+
+
+def get_colormap(label_names: Iterable[str], colormap_name: str = "gist_rainbow") -> Dict[str, str]:
+    """
+    Assign a hex color to each label by evenly sampling a colormap.
+
+    The palettes in `PALETTES` ("gist_rainbow", "hsv", "jet", "tab10", "tab20") are built in and
+    reproduce matplotlib's colors exactly; any other name is looked up in matplotlib, if installed.
+    Results are memoized per (labels, colormap_name).
+
+    Args:
+    label_names (Iterable[str]): Labels to assign colors to.
+    colormap_name (str, optional): Name of the colormap to sample.
+
+    Returns:
+    Dict[str, str]: Mapping from label to "#rrggbb" color.
+    """
+    return dict(_get_colormap(tuple(label_names), colormap_name))
@@ -0,0 +1,159 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+from __future__ import annotations
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Literal, Optional, Sequence
+from .image_cache import ImageCache, ImageIdentity, ImageSource, image_cache, load_image
+
+
+class LabelDataset:
+    """
+    A sequence of images labeled one after the other, with the neighbours of the current image
+    decoded, resized and encoded in the background.
+
+    Images are prepared by the same pipeline and into the same cache as in `detection()`,
+    `segmentation()` and `annotation()`, so that passing `image_args(index)` to them serves
+    a prefetched image without any decoding. The dataset holds no position of its own and can be
+    shared by all sessions, e.g. through `st.cache_resource`; keep the index in `st.session_state`.
+
+    Args:
+    images (Sequence[Union[str, PIL.Image.Image, np.ndarray, bytes]]): Paths to the image files, or images in memory.
+    image_width (int, optional): Width to which images are resized, as passed to the components.
+    image_height (int, optional): Height to which images are resized, as passed to the components.
+    prefetch (int, optional): Number of images prepared ahead of and behind the current one.
+    image_ids (Sequence[str], optional): Caller-supplied content id of each image, see `image_identity`.
+    image_identity (Union[Literal["stat", "content"], Callable], optional): How images are identified when `image_ids` is not given.
+    image_format (Literal["auto", "png", "jpeg", "webp"], optional): Format the displayed images are sent in.
+    image_quality (int, optional): JPEG/WebP quality (1-100) of the displayed images, ignored for PNG.
+    max_workers (int, optional): Number of threads preparing images. Defaults to `prefetch`, at most 4.
+    cache (ImageCache, optional): Cache to prefetch into instead of the process-wide `image_cache`. The components
+        always use `image_cache`, so a different cache only makes sense when calling `load_image` directly.
+    """
+
+    def __init__(
+        self,
+        images: Sequence[ImageSource],
+        image_width: int = 512,
+        image_height: int = 512,
+        prefetch: int = 2,
+        image_ids: Optional[Sequence[str]] = None,
+        image_identity: ImageIdentity = "stat",
+        image_format: Literal["auto", "png", "jpeg", "webp"] = "auto",
+        image_quality: int = 85,
+        max_workers: Optional[int] = None,
+        cache: Optional[ImageCache] = None,
+    ):
+        if image_ids is not None and len(image_ids) != len(images):
+            raise ValueError(f"Got {len(image_ids)} image ids for {len(images)} images")
+
+        self.images = images
+        self.image_width = image_width
+        self.image_height = image_height
+        self.prefetch_count = prefetch
+        self.image_ids = image_ids
+        self.image_identity = image_identity
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.cache = image_cache if cache is None else cache
+
+        self._lock = threading.Lock()
+        self._loading: Dict[int, Future] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(1, min(prefetch, 4)),
+            thread_name_prefix="label-kit-prefetch",
+        )
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def image_args(self, index: int) -> dict:
+        """
+        Return the image arguments of `detection()`, `segmentation()` or `annotation()` for the image at `index`,
+        and start preparing its neighbours.
+
+        Waits for the image if it is being prefetched, so that it is not prepared twice.
+
+        Example:
+        detection(**dataset.image_args(index), label_list=labels, key="detection")
+        """
+        index = self._check_index(index)
+        self.prefetch(index)
+
+        with self._lock:
+            future = self._loading.get(index)
+        if future is not None:
+            # Errors are raised again by the component, which loads the image itself
+            future.exception()
+
+        return {
+            "image": self.images[index],
+            "image_width": self.image_width,
+            "image_height": self.image_height,
+            "image_id": self.image_ids[index] if self.image_ids is not None else None,
+            "image_identity": self.image_identity,
+            "image_format": self.image_format,
+            "image_quality": self.image_quality,
+        }
+
+    def prefetch(self, index: int) -> None:
+        """
+        Start preparing the image at `index` and the `prefetch` images after and before it, nearest first.
+        """
+        index = self._check_index(index)
+        order = [index]
+        for offset in range(1, self.prefetch_count + 1):
+            order += [i for i in (index + offset, index - offset) if 0 <= i < len(self.images)]
+
+        started = []
+        with self._lock:
+            for i in order:
+                if i not in self._loading:
+                    future = self._executor.submit(self._load, i)
+                    self._loading[i] = future
+                    started.append((i, future))
+        # A future that is already done runs its callback right away, and the callback takes the lock
+        for i, future in started:
+            future.add_done_callback(lambda _, i=i: self._done(i))
+
+    def close(self) -> None:
+        """Stop prefetching; images already queued are dropped."""
+        # Cancelling runs the done callbacks, which take the lock
+        with self._lock:
+            futures = list(self._loading.values())
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self) -> LabelDataset:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _check_index(self, index: int) -> int:
+        if not -len(self.images) <= index < len(self.images):
+            raise IndexError(f"Image index {index} out of range for a dataset of {len(self.images)} images")
+        return index % len(self.images)
+
+    def _load(self, index: int) -> None:
+        load_image(
+            self.images[index],
+            self.image_width,
+            self.image_height,
+            self.image_ids[index] if self.image_ids is not None else None,
+            self.image_identity,
+            self.image_format,
+            self.image_quality,
+            self.cache,
+        )
+
+    def _done(self, index: int) -> None:
+        # Once prepared, the image is in the cache; it is prefetched again if it was evicted meanwhile
+        with self._lock:
+            self._loading.pop(index, None)
@@ -6,27 +6,18 @@
 #
 
 from __future__ import annotations
-from hashlib import md5
 from typing import Literal, Union, List, Dict
-import matplotlib.pyplot as plt
 import numpy as np
-from PIL import Image
+import streamlit as st
 from streamlit.components.v1.components import CustomComponent
-from . import _component_func, convert_bbox_format, relative_to_absolute, absolute_to_relative, thumbnail_with_upscale
+from . import _component_func, convert_bboxes
+from .colormap import get_colormap
+from .image_cache import ImageIdentity, _read_stream, load_image, get_image_url, register_media
+from .patch import PatchState, TransferMode, input_digest
+from .store import AnnotationStore, _record_labels, _store_value, record_id
+from .sync import join_sync_group
+from .tiles import TilePyramid
 
-try:  # track API changes in streamlit 1.42.0
-  from streamlit.elements.lib.image_utils import image_to_url
-except ImportError:
-  from streamlit.elements.image import image_to_url
-
-
-def _get_colormap(label_names, colormap_name="gist_rainbow"):
-    colormap = {}
-    cmap = plt.get_cmap(colormap_name)
-    for idx, l in enumerate(label_names):
-        rgb = [int(d) for d in np.array(cmap(float(idx) / len(label_names))) * 255][:3]
-        colormap[l] = "#%02x%02x%02x" % tuple(rgb)
-    return colormap
 
 SELECT_HEIGHT = 60
 RADIO_HEGIHT = 34
@@ -52,10 +43,99 @@ def _calc_size(size):
 
     return ui_height, ui_width
 
+
+def _encode_bbox_columns(bboxes: np.ndarray, labels: list, meta_data: list, info_dict: list, bbox_ids: list) -> dict:
+    # Compact transport to the frontend: flattened XYWH bboxes and label indices into `label_list`;
+    # meta data and info dicts are only sent for the bboxes that have them, keyed by index
+    return {
+        "bbox": bboxes.ravel().tolist(),
+        "label_id": [int(label) for label in labels],
+        "id": list(bbox_ids),
+        "meta": {i: meta for i, meta in enumerate(meta_data) if meta},
+        "additional_data": {i: info for i, info in enumerate(info_dict) if info},
+    }
+
+def _label_names(label_ids: list, unknown: dict, bbox_ids: list, label_list: list) -> list:
+    # Labels not in `label_list` come with id -1 and their name in `unknown`, keyed by index
+    names = []
+    for i, label_id in enumerate(label_ids):
+        if label_id >= 0:
+            names.append(label_list[label_id])
+        elif str(i) in unknown:
+            names.append(unknown[str(i)])
+        else:
+            raise ValueError(f"Bbox {bbox_ids[i]!r} was returned with label id {label_id} and no label name")
+    return names
+
+# Keys of the returned bbox dicts for each column of return_format="columnar"
+_COLUMN_KEYS = {"labels": "labels", "label_names": "label_names", "ids": "bbox_ids", "meta_data": "meta_data", "info_dict": "info_dict"}
+
+def _items_to_columns(items: list) -> dict:
+    columns = {"bboxes": np.array([item["bboxes"] for item in items], dtype=float).reshape(-1, 4)}
+    for name, item_key in _COLUMN_KEYS.items():
+        columns[name] = [item[item_key] for item in items]
+    columns["labels"] = np.array(columns["labels"], dtype=int)
+    return columns
+
+def _columns_to_items(columns: dict) -> list:
+    return [
+        {
+            "bboxes": bbox,
+            "bbox_ids" : bbox_id,
+            "labels": label,
+            "label_names": label_name,
+            "meta_data": meta,
+            "info_dict": info,
+        }
+        for bbox, bbox_id, label, label_name, meta, info in zip(
+            columns["bboxes"].tolist(),
+            columns["ids"],
+            columns["labels"].tolist(),
+            columns["label_names"],
+            columns["meta_data"],
+            columns["info_dict"],
+        )
+    ]
+
+def _detection_record(bboxes, bbox_format: str, image_size) -> dict:
+    columns = bboxes if isinstance(bboxes, dict) else _items_to_columns(bboxes)
+    return {
+        "bboxes": columns["bboxes"],
+        "bbox_format": bbox_format,
+        "bbox_ids": columns["ids"],
+        "labels": columns["labels"],
+        "label_names": columns["label_names"],
+        "meta_data": columns["meta_data"],
+        "info_dict": columns["info_dict"],
+        "image_size": image_size,
+    }
+
+def _record_inputs(record: dict, bbox_format: str, image_size, label_list: list) -> tuple:
+    # bboxes, labels, bbox_ids, meta_data and info_dict of a record, as given to detection()
+    bboxes = convert_bboxes(
+        np.asarray(record["bboxes"], dtype=float).reshape(-1, 4),
+        record["bbox_format"], bbox_format, image_size[0], image_size[1],
+    )
+    labels = _record_labels(record, label_list)
+    return bboxes, labels, list(record["bbox_ids"]), list(record["meta_data"]), list(record["info_dict"])
+
+def _tile_info(pyramid: TilePyramid, keys: list, key) -> dict:
+    # Tiles are media files like the overview image, so the ones shown are registered again on every run
+    mimetype = f"image/{pyramid.image_format}"
+    return {
+        "tile_size": pyramid.tile_size,
+        "levels": pyramid.levels,
+        "urls": {
+            tile_key: register_media(data, mimetype, f"tile-{pyramid.digest}-{key}-{tile_key}")
+            for tile_key, data in pyramid.tiles(keys).items()
+        },
+    }
+
+
 def detection(
     #read_only
-    image_path,
-    label_list,
+    image_path=None,
+    label_list=[],
     bboxes=None,
     bbox_ids=[],
     labels=[],
@@ -82,6 +162,21 @@ def detection(
     bbox_show_label: bool = False,
     bbox_show_info: bool = False,
     component_alignment: Literal["left", "center", "right"] = "left",
+    colormap: str = "gist_rainbow",
+    return_format: Literal["list", "columnar"] = "list",
+    transfer_mode: TransferMode = "full",
+    commit_mode: Literal["immediate", "debounce", "explicit"] = "immediate",
+    commit_delay: int = 500,
+    image=None,
+    image_id: str = None,
+    image_identity: ImageIdentity = "stat",
+    image_format: Literal["auto", "png", "jpeg", "webp"] = "auto",
+    image_quality: int = 85,
+    tiled: bool = False,
+    tile_size: int = 256,
+    tile_cache_dir: str = None,
+    store: AnnotationStore = None,
+    sync_group: str = None,
     key=None,
 ) -> CustomComponent:
     """
@@ -89,11 +184,11 @@ def detection(
     optionally allowing the user to edit metadata and other details.
 
     Args:
-        image_path (str): Path to the image file for annotation.
+        image_path (str, optional): Path to the image file for annotation. Not needed if `image` is given.
         label_list (List[str]): List of labels for bounding boxes.
-        bboxes (List[Tuple[float, float, float, float]], optional): List of bounding boxes in the format specified by `bbox_format`.
-        bbox_ids (List[str], optional): Unique identifiers for each bounding box.
-        labels (List[int], optional): Indices from `label_list` corresponding to each bounding box.
+        bboxes (Union[np.ndarray, List[Tuple[float, float, float, float]]], optional): (N, 4) array or list of bounding boxes in the format specified by `bbox_format`.
+        bbox_ids (Union[np.ndarray, List[str]], optional): Unique identifiers for each bounding box.
+        labels (Union[np.ndarray, List[int]], optional): Indices from `label_list` corresponding to each bounding box.
         read_only (bool, optional): Disables editing features, making UI read-only.
         info_dict (List[Dict[str, str]], optional): List of dictionaries with additional info for each bounding box.
         meta_data (List[List[str]], optional): Metadata for each bounding box.
@@ -117,6 +212,21 @@ def detection(
         bbox_show_label (bool, optional): If True, display labels near bounding boxes.
         bbox_show_info (bool, optional): If True, display additional info near bounding boxes.
         component_alignment (Literal["left", "center", "right"], optional): Alignment of the component within its container.
+        colormap (str, optional): Colormap used to color labels; "gist_rainbow", "hsv", "jet", "tab10" and "tab20" are built in, other names require matplotlib.
+        return_format (Literal["list", "columnar"], optional): With "columnar", "bbox" is returned as a dict of columns instead of one dict per bbox: {"bboxes": (N, 4) np.ndarray, "labels": (N,) np.ndarray, "label_names": [str], "ids": [str], "meta_data": [[str]], "info_dict": [dict]}.
+        transfer_mode (Literal["full", "patch"], optional): With "patch", the frontend only sends the bboxes added, modified or deleted by each edit, which are applied to a copy of the bboxes cached in the session state.
+        commit_mode (Literal["immediate", "debounce", "explicit"], optional): When edits are sent back to Python (each causing a rerun): "immediate" sends every edit; "debounce" sends the latest state once no edit was made for `commit_delay` ms; "explicit" only sends it on the Save button or Ctrl/Cmd+S. Until then, the frontend keeps its local state.
+        commit_delay (int, optional): Idle time in milliseconds before edits are sent with commit_mode="debounce".
+        image (Union[PIL.Image.Image, np.ndarray, bytes, BinaryIO], optional): The image in memory instead of a file: a PIL Image, an HxW or HxWxC uint8 array, or encoded image bytes or a file object. Takes precedence over `image_path`; identified by a CRC32 of its bytes or pixels unless `image_id` is given.
+        image_id (str, optional): Caller-supplied content id of the image (e.g. a dataset hash), used to cache and name the served image.
+        image_identity (Union[Literal["stat", "content"], Callable], optional): How the image is identified when `image_id` is not given: "stat" (path, inode, mtime, size), "content" (CRC32 of the file bytes) or a callable returning an id for the image (path or image in memory).
+        image_format (Literal["auto", "png", "jpeg", "webp"], optional): Format the displayed image is sent in. "auto" keeps images with transparency or at most 256 colors (masks, overlays, drawings) lossless as PNG and sends photos as JPEG.
+        image_quality (int, optional): JPEG/WebP quality (1-100) of the displayed image, ignored for PNG.
+        tiled (bool, optional): For images much larger than the display (satellite scenes, slides). The resized image is shown as an overview, which can be zoomed with the mouse wheel and panned by dragging with the right or middle button; the visible region is then loaded at full detail from a tile pyramid generated lazily from the image and cached on disk. Bboxes are edited in original image pixels. Requires `key`.
+        tile_size (int, optional): Width and height of a tile in pixels with tiled=True.
+        tile_cache_dir (str, optional): Directory tiles are cached in with tiled=True; defaults to "streamlit-label-kit-tiles" in the temporary directory.
+        store (AnnotationStore, optional): Persistent store the initial annotations are read from when `bboxes` is None, and every new returned value is written to. Records are stored under `image_id`, else the image path, else the identity of the image in memory.
+        sync_group (str, optional): Name of a group of linked detection components in the session (e.g. two views of one image). An edit in any of them is shown by all in the same rerun, and all return the shared state with its `revision`. Until the first edit, or when their inputs change, each shows its inputs. Requires `key`.
         key (any, optional): A unique key to differentiate this instance when using multiple instances.
 
     Returns:
@@ -137,31 +247,46 @@ def detection(
                 ],
                 "image_size": (int, int), # Original dimensions of the input image
                 "bbox_format": str,      # Format of the bounding box data
-                "key": str               # Unique identifier for the returned value
+                "key": str,              # Unique identifier for the returned value
+                "revision": int,         # With sync_group: number of edits to the shared state
             }
     """
 
     # Load Image and convert size
-    image = Image.open(image_path)
-    original_image_size = image.size
-    image = thumbnail_with_upscale(image, (image_width, image_height))
-
-    image_url = image_to_url(
-        image,
-        image.size[0],
-        True,
-        "RGB",
-        "PNG",
-        f"annotation-{md5(image.tobytes()).hexdigest()}-{key}",
-    )
-    if image_url.startswith("/"):
-        image_url = image_url[1:]
+    if image is None and image_path is None:
+        raise ValueError("Either image_path or image must be given")
+    source = _read_stream(image if image is not None else image_path)
+    cached = load_image(source, image_width, image_height, image_id, image_identity, image_format, image_quality)
+    store_id = record_id(image if image is not None else image_path, image_id, cached.digest)
+    image = cached.image
+    original_image_size = cached.original_size
+
+    image_url = get_image_url(cached, "annotation", key)
+    component_key = key
 
-    color_map = _get_colormap(label_list, colormap_name="gist_rainbow")
+    color_map = get_colormap(label_list, colormap_name=colormap)
 
     resized_image_size = image.size
     scale = original_image_size[0] / resized_image_size[0]
 
+    # In tiled mode the frontend works in original pixels, loading the tiles it asks for at the current zoom
+    tile_info = None
+    if tiled:
+        if key is None:
+            # Without a key, every new set of tiles would remount the component and reset its view
+            raise ValueError("detection() requires a key with tiled=True")
+        scale = 1.0
+        pyramid = TilePyramid(
+            source, cached.digest, original_image_size, tile_size, cached.format, image_quality, tile_cache_dir
+        )
+
+        # The request is read from the component value before rendering, so the tiles are served in the same run.
+        # It is kept until the next request, as the values sent in between do not repeat it.
+        last_value = st.session_state.get(key)
+        if isinstance(last_value, dict) and last_value.get("tiles") is not None:
+            st.session_state[f"_label_kit_tiles-{key}"] = last_value["tiles"]
+        tile_info = _tile_info(pyramid, st.session_state.get(f"_label_kit_tiles-{key}", []), key)
+
     # Configure UI position and size
     _class_select_pos = class_select_position or ui_position
     _item_editor_pos = item_editor_position or ui_position
@@ -175,6 +300,73 @@ def detection(
 
     _select_type = "radio" if class_select_type != "select" else "select"
 
+    def _original_bboxes(bboxes):
+        # Convert back to original scale and format
+        bboxes = np.array(bboxes, dtype=float).reshape(-1, 4) * scale
+        return convert_bboxes(bboxes, "XYWH", bbox_format, original_image_size[0], original_image_size[1])
+
+    def _convert_bboxes(items):
+        return [
+            {
+                "bboxes": bbox,
+                "bbox_ids" : item["id"],
+                "labels": item["label_id"],
+                "label_names": item["label"],
+                "meta_data": item["meta"],
+                "info_dict": item["additional_data"],
+            }
+            for bbox, item in zip(_original_bboxes([item["bbox"] for item in items]).tolist(), items)
+        ]
+
+    def _decode(component_value):
+        # Returned bboxes (items or columns) of a component value; also called for other members of a sync group
+        if transfer_mode == "patch":
+            patch_state = st.session_state.setdefault(f"_label_kit_patch-{component_key}", PatchState())
+            if "patch" in component_value:
+                patch_state.apply(component_value["patch"], lambda item: _convert_bboxes([item])[0])
+            return patch_state.values()
+        if "bbox" in component_value:
+            wire = component_value["bbox"]
+            meta, info = wire.get("meta", {}), wire.get("additional_data", {})
+            label_ids = wire["label_id"]
+            return {
+                "bboxes": _original_bboxes(wire["bbox"]),
+                "labels": np.array(label_ids, dtype=int),
+                "label_names": _label_names(label_ids, wire.get("label", {}), wire["id"], label_list),
+                "ids": wire["id"],
+                "meta_data": [meta.get(str(i), []) for i in range(len(label_ids))],
+                "info_dict": [info.get(str(i), {}) for i in range(len(label_ids))],
+            }
+        return []
+
+    # Resume from the store when no annotations are given
+    if store is not None and bboxes is None:
+        record = store.get(store_id, "detection")
+        if record is not None:
+            bboxes, labels, bbox_ids, meta_data, info_dict = _record_inputs(
+                record, bbox_format, original_image_size, label_list
+            )
+
+    # Linked components show the latest edit made in any of them
+    group = None
+    if sync_group is not None:
+        group = join_sync_group(
+            sync_group, "detection", component_key,
+            input_digest(cached.digest, bboxes, labels, bbox_ids, meta_data, info_dict, bbox_format),
+            lambda value: _detection_record(_decode(value), bbox_format, original_image_size),
+        )
+        if group.record is not None:
+            bboxes, labels, bbox_ids, meta_data, info_dict = _record_inputs(
+                group.record, bbox_format, original_image_size, label_list
+            )
+
+    # Accept arrays (e.g. model outputs) as well as lists
+    bboxes = np.asarray([] if bboxes is None else bboxes, dtype=float).reshape(-1, 4)
+    labels, bbox_ids, meta_data, info_dict = (
+        value.tolist() if isinstance(value, np.ndarray) else value
+        for value in (labels, bbox_ids, meta_data, info_dict)
+    )
+
     # Configure default labels, meta_data, additional_info
     num_bboxes = len(bboxes)
     if len(labels) > num_bboxes:
@@ -197,33 +389,36 @@ def detection(
     else:
         bbox_ids.extend(["bbox-" + str(i + len(bbox_ids)) for i in range(num_bboxes - len(bbox_ids))])
 
-    # Convert BBOX Format to XYWH
-    if "REL" in bbox_format:
-        bboxes = [
-            relative_to_absolute(bbox, original_image_size[0], original_image_size[1])
-            for bbox in bboxes
-        ]
-        original_format = bbox_format.replace("REL_", "")
-    else:
-        original_format = bbox_format
-    bboxes = [convert_bbox_format(bbox, original_format, "XYWH") for bbox in bboxes]
+    input_bboxes = bboxes
 
-    bbox_info = [
-        {
-            "bbox": [b / scale for b in item[0]],
-            "label": label_list[item[1]],
-            "meta": item[2],
-            "additional_data": item[3],
-            "id": item[4],
-        }
-        for item in zip(bboxes, labels, meta_data, info_dict, bbox_ids)
-    ]
+    # Convert BBOX Format to XYWH at display scale
+    bboxes = convert_bboxes(bboxes, bbox_format, "XYWH", original_image_size[0], original_image_size[1]) / scale
+
+    bbox_info = _encode_bbox_columns(bboxes, labels, meta_data, info_dict, bbox_ids)
     
+    # Cache the bboxes as returned, so that patches from the frontend can be applied to them
+    patch_base = None
+    if transfer_mode == "patch":
+        patch_state = st.session_state.setdefault(f"_label_kit_patch-{key}", PatchState())
+        patch_base = input_digest(input_bboxes, labels, meta_data, info_dict, bbox_ids, bbox_format, resized_image_size, tiled)
+        if patch_state.base != patch_base:
+            patch_state.reset(patch_base, {
+                item[4]: {
+                    "bboxes": item[0],
+                    "bbox_ids": item[4],
+                    "labels": int(item[1]),
+                    "label_names": label_list[int(item[1])],
+                    "meta_data": item[2],
+                    "info_dict": item[3],
+                }
+                for item in zip(input_bboxes.tolist(), labels, meta_data, info_dict, bbox_ids)
+            })
+
     _justify_content = {"left": "start", "center":"center", "right":"end"}[component_alignment]
 
     component_value = _component_func(
         image_url=image_url,
-        image_size=image.size,
+        image_size=original_image_size if tiled else image.size,
         label_list=label_list,
         bbox_info=bbox_info,
         color_map=color_map,
@@ -247,48 +442,45 @@ def detection(
         bbox_show_additional=bbox_show_info,
         justify_content=_justify_content,
         label_type="detection",
+        transfer_mode=transfer_mode,
+        patch_base=patch_base,
+        commit_mode=commit_mode,
+        commit_delay=commit_delay,
+        tile_info=tile_info,
     )
-    
+
     _bboxes = []
     key = 0
-    if component_value is not None:
-        bboxes = component_value["bbox"]
+    if group is not None:
+        # Linked components return the state they show
+        key = group.key
+        _bboxes = {
+            "bboxes": input_bboxes,
+            "labels": np.array(labels, dtype=int),
+            "label_names": [label_list[int(i)] for i in labels],
+            "ids": list(bbox_ids),
+            "meta_data": list(meta_data),
+            "info_dict": list(info_dict),
+        }
+    elif component_value is not None:
         key = int(component_value["key"])
-        _bboxes = [
-            {
-                "bboxes": [b * scale for b in item["bbox"]],
-                "bbox_ids" : item["id"],
-                "labels": item["label_id"],
-                "label_names": item["label"],
-                "meta_data": item["meta"],
-                "info_dict": item["additional_data"],
-            }
-            for item in bboxes
-        ]
+        _bboxes = _decode(component_value)
 
-        # Convert back to original format
-        if "REL" in bbox_format:
-            bboxes = [
-                convert_bbox_format(bbox["bboxes"], "XYWH", original_format)
-                for bbox in _bboxes
-            ]
-            bboxes = [
-                absolute_to_relative(bbox, original_image_size[0], original_image_size[1])
-                for bbox in bboxes
-            ]
-        else:
-            bboxes = [
-                convert_bbox_format(bbox["bboxes"], "XYWH", original_format)
-                for bbox in _bboxes
-            ]
-        for i in range(len(_bboxes)):
-            _bboxes[i]["bboxes"] = bboxes[i]
-            
-            
-    return {
+    if return_format == "columnar" and isinstance(_bboxes, list):
+        _bboxes = _items_to_columns(_bboxes)
+    elif return_format != "columnar" and isinstance(_bboxes, dict):
+        _bboxes = _columns_to_items(_bboxes)
+
+    if store is not None:
+        _store_value(store, "detection", store_id, key, lambda: _detection_record(_bboxes, bbox_format, original_image_size), component_key)
+
+    result = {
         "bbox": _bboxes,
         "image_size": original_image_size,
         "resized_image_size": resized_image_size,
         "bbox_format": bbox_format,
         "key": key,
     }
+    if group is not None:
+        result["revision"] = group.revision
+    return result
@@ -0,0 +1,618 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+from __future__ import annotations
+import json
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image, ImageDraw
+from . import convert_bboxes
+from .mask import _counts_to_string, decode_mask, mask_to_rle, resize_mask
+from .store import AnnotationStore, _record_labels
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+# Files handled per task, and tasks in flight per worker, when reading or writing a directory
+BATCH_SIZE = 64
+TASKS_PER_WORKER = 4
+
+_JSON_CHUNK_SIZE = 1 << 16
+
+
+class LabeledImage(NamedTuple):
+    """
+    Annotations of one image, with `detection` and `segmentation` in the record format of `AnnotationStore`.
+    """
+    image: str                              # image path or id, as passed to the components
+    image_size: Optional[Tuple[int, int]]   # (width, height), None if unknown
+    detection: Optional[dict] = None
+    segmentation: Optional[dict] = None
+
+
+def _detection_record(
+    bboxes, bbox_format: str, labels: List[int], label_list: Optional[Sequence[str]],
+    bbox_ids: List[str], image_size: Optional[Tuple[int, int]],
+) -> dict:
+    return {
+        "bboxes": np.asarray(bboxes, dtype=float).reshape(-1, 4),
+        "bbox_format": bbox_format,
+        "bbox_ids": bbox_ids,
+        "labels": labels,
+        "label_names": [label_list[i] for i in labels] if label_list is not None else None,
+        "meta_data": [[] for _ in labels],
+        "info_dict": [{} for _ in labels],
+        "image_size": image_size,
+    }
+
+
+def _segmentation_record(
+    masks: list, labels: List[int], label_list: Sequence[str], mask_ids: List[str], image_size: Tuple[int, int],
+) -> dict:
+    return {
+        "masks": masks,
+        "mask_size": image_size,
+        "mask_ids": mask_ids,
+        "labels": labels,
+        "label_names": [label_list[i] for i in labels],
+        "meta_data": [[] for _ in labels],
+        "info_dict": [{} for _ in labels],
+        "image_size": image_size,
+    }
+
+
+def _absolute_bboxes(item: LabeledImage, bbox_format: str) -> np.ndarray:
+    record = item.detection
+    width, height = item.image_size or (None, None)
+    if item.image_size is None and record["bbox_format"].startswith("REL_") and bbox_format.startswith("REL_"):
+        # Relative to relative does not depend on the image size
+        width, height = 1, 1
+    return convert_bboxes(record["bboxes"], record["bbox_format"], bbox_format, width, height)
+
+
+def _parallel_map(fn: Callable, items: Iterable, max_workers: Optional[int], use_processes: bool) -> Iterator:
+    # Items are submitted in batches with a bounded number in flight, so that results stream out in order
+    # without the whole directory being queued
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    workers = max_workers or os.cpu_count() or 1
+    with executor_class(max_workers=workers) as executor:
+        pending = deque()
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == BATCH_SIZE:
+                pending.append(executor.submit(_map_batch, fn, batch))
+                batch = []
+                if len(pending) >= workers * TASKS_PER_WORKER:
+                    yield from pending.popleft().result()
+        if batch:
+            pending.append(executor.submit(_map_batch, fn, batch))
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _map_batch(fn: Callable, batch: list) -> list:
+    return [fn(item) for item in batch]
+
+
+def _list_files(directory: str, extensions: Tuple[str, ...]) -> List[str]:
+    with os.scandir(directory) as entries:
+        return sorted(entry.name for entry in entries if entry.is_file() and entry.name.lower().endswith(extensions))
+
+
+def _image_files(image_dir: Optional[str]) -> Dict[str, str]:
+    if image_dir is None:
+        return {}
+    return {os.path.splitext(name)[0]: os.path.join(image_dir, name) for name in _list_files(image_dir, IMAGE_EXTENSIONS)}
+
+
+def _file_stem(image: str) -> str:
+    return os.path.splitext(os.path.basename(image))[0]
+
+
+# COCO
+
+class _JSONStream:
+    # Incremental reader of a JSON document, decoding one value at a time from a buffered file
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(_JSON_CHUNK_SIZE)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return bool(chunk)
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid JSON: expected one of {chars!r}, got {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def _iter_json_arrays(path: str, keys: Tuple[str, ...]) -> Iterator[Tuple[str, object]]:
+    # Yields (key, item) for the items of the top-level arrays named in `keys`, in file order
+    with open(path, encoding="utf-8") as f:
+        stream = _JSONStream(f)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if stream.peek() == "[":
+                for item in stream.array():
+                    if key in keys:
+                        yield key, item
+            else:
+                stream.value()
+            if stream.expect(",}") == "}":
+                return
+
+
+def _coco_mask(segmentation, image_size: Tuple[int, int]) -> dict:
+    width, height = image_size
+    if isinstance(segmentation, dict):
+        counts = segmentation["counts"]
+        if not isinstance(counts, str):
+            counts = _counts_to_string(list(counts))
+        return {"size": list(segmentation["size"]), "counts": counts}
+
+    # Polygons [[x0, y0, x1, y1, ...], ...]
+    canvas = Image.new("1", (width, height))
+    draw = ImageDraw.Draw(canvas)
+    for polygon in segmentation:
+        if len(polygon) >= 6:
+            draw.polygon(list(map(float, polygon)), fill=1)
+    return mask_to_rle(np.asarray(canvas), compressed=True)
+
+
+def _coco_image(
+    image: str, image_size: Tuple[int, int], annotations: list, category_labels: Dict[int, int],
+    label_list: Sequence[str], masks: bool,
+) -> LabeledImage:
+    bboxes, bbox_labels, bbox_ids = [], [], []
+    mask_list, mask_labels, mask_ids = [], [], []
+    for annotation in annotations:
+        label = category_labels.get(annotation["category_id"])
+        if label is None:
+            continue
+        if masks and annotation.get("segmentation"):
+            mask_list.append(_coco_mask(annotation["segmentation"], image_size))
+            mask_labels.append(label)
+            mask_ids.append(f"mask-{annotation['id']}")
+        elif "bbox" in annotation:
+            bboxes.append(annotation["bbox"])
+            bbox_labels.append(label)
+            bbox_ids.append(f"bbox-{annotation['id']}")
+
+    return LabeledImage(
+        image,
+        image_size,
+        _detection_record(bboxes, "XYWH", bbox_labels, label_list, bbox_ids, image_size),
+        _segmentation_record(mask_list, mask_labels, label_list, mask_ids, image_size) if masks else None,
+    )
+
+
+def read_coco(
+    path: str,
+    label_list: Optional[Sequence[str]] = None,
+    image_dir: Optional[str] = None,
+    masks: bool = True,
+) -> Iterator[LabeledImage]:
+    """
+    Read a COCO json file image by image.
+
+    The file is parsed incrementally, so only the image and category tables are held in memory, not the
+    annotations. Annotations with a `segmentation` (RLE or polygons) become masks and the others bboxes.
+    Annotations are yielded grouped by image in file order; an image whose annotations are not contiguous
+    (`write_coco` always writes them contiguously) is yielded once per run, which `import_annotations` merges.
+    Images without annotations are yielded last.
+
+    Args:
+    path (str): Path to the COCO json file.
+    label_list (Sequence[str], optional): Labels the category names are mapped to; annotations of other
+        categories are skipped. Defaults to the category names, in order of category id.
+    image_dir (str, optional): Directory prepended to the `file_name` of each image.
+    masks (bool, optional): If False, segmentations are ignored and every annotation becomes a bbox.
+
+    Returns:
+    Iterator[LabeledImage]: The annotations of each image.
+    """
+    categories = {}
+    images = {}
+    for key, item in _iter_json_arrays(path, ("categories", "images")):
+        if key == "categories":
+            categories[item["id"]] = item["name"]
+        else:
+            name = item["file_name"] if image_dir is None else os.path.join(image_dir, item["file_name"])
+            images[item["id"]] = (name, (item["width"], item["height"]))
+
+    if label_list is None:
+        label_list = [categories[i] for i in sorted(categories)]
+    label_index = {name: i for i, name in enumerate(label_list)}
+    category_labels = {i: label_index[name] for i, name in categories.items() if name in label_index}
+
+    annotated = set()
+    run_id, run = None, []
+    for _, annotation in _iter_json_arrays(path, ("annotations",)):
+        if annotation["image_id"] != run_id:
+            if run:
+                yield _coco_image(*images[run_id], run, category_labels, label_list, masks)
+            run_id, run = annotation["image_id"], []
+            annotated.add(run_id)
+        run.append(annotation)
+    if run:
+        yield _coco_image(*images[run_id], run, category_labels, label_list, masks)
+
+    for image_id, (image, image_size) in images.items():
+        if image_id not in annotated:
+            yield _coco_image(image, image_size, [], category_labels, label_list, masks)
+
+
+def _coco_annotations(item: LabeledImage, label_list: Sequence[str]) -> Iterator[dict]:
+    if item.detection is not None:
+        record = item.detection
+        bboxes = _absolute_bboxes(item, "XYWH")
+        for bbox, label in zip(bboxes.tolist(), _record_labels(record, label_list)):
+            yield {"category_id": label + 1, "bbox": bbox, "area": bbox[2] * bbox[3], "iscrowd": 0}
+
+    if item.segmentation is not None:
+        record = item.segmentation
+        for mask, label in zip(record["masks"], _record_labels(record, label_list)):
+            mask = resize_mask(decode_mask(mask), item.image_size)
+            rows = np.flatnonzero(mask.any(axis=1))
+            cols = np.flatnonzero(mask.any(axis=0))
+            bbox = (
+                [int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)]
+                if len(rows) else [0, 0, 0, 0]
+            )
+            yield {
+                "category_id": label + 1,
+                "segmentation": mask_to_rle(mask, compressed=True),
+                "bbox": bbox,
+                "area": int(mask.sum()),
+                "iscrowd": 0,
+            }
+
+
+def write_coco(path: str, images: Iterable[LabeledImage], label_list: Sequence[str]) -> int:
+    """
+    Write annotations to a COCO json file, one image at a time.
+
+    Images are written as they are read from `images` and annotations are spooled to a temporary
+    file, so neither is held in memory. Category ids are the positions in `label_list`, starting at 1,
+    and masks are written as compressed RLE at the image size.
+
+    Args:
+    path (str): Path of the COCO json file to write.
+    images (Iterable[LabeledImage]): Annotated images, e.g. from `stored_images` or one of the readers.
+        Their `image_size` is required.
+    label_list (Sequence[str]): Labels of the annotations, written as the categories.
+
+    Returns:
+    int: The number of images written.
+    """
+    categories = [{"id": i + 1, "name": name} for i, name in enumerate(label_list)]
+    count = 0
+    annotation_id = 0
+    with open(path, "w", encoding="utf-8") as f, tempfile.TemporaryFile("w+", encoding="utf-8") as annotations:
+        f.write(f'{{"categories": {json.dumps(categories)}, "images": [')
+        for item in images:
+            if item.image_size is None:
+                raise ValueError(f"The size of image {item.image!r} is required to write COCO")
+            count += 1
+            entry = {"id": count, "file_name": item.image, "width": item.image_size[0], "height": item.image_size[1]}
+            f.write(("," if count > 1 else "") + json.dumps(entry))
+            for annotation in _coco_annotations(item, label_list):
+                annotation_id += 1
+                annotation = {"id": annotation_id, "image_id": count, **annotation}
+                annotations.write(("," if annotation_id > 1 else "") + json.dumps(annotation))
+        f.write('], "annotations": [')
+        annotations.seek(0)
+        shutil.copyfileobj(annotations, f)
+        f.write("]}")
+    return count
+
+
+# YOLO
+
+def _read_yolo_file(paths: Tuple[str, Optional[str]], label_list: Optional[Sequence[str]]) -> LabeledImage:
+    label_path, image_path = paths
+    with open(label_path) as f:
+        # Only bbox lines (class cx cy w h); polygon lines of YOLO segmentation are skipped
+        rows = [fields for fields in (line.split() for line in f) if len(fields) == 5]
+    values = np.array(rows, dtype=float).reshape(-1, 5)
+    labels = values[:, 0].astype(int).tolist()
+    if label_list is not None and any(label >= len(label_list) for label in labels):
+        raise ValueError(f"{label_path}: class index out of range for {len(label_list)} labels")
+
+    image_size = None
+    if image_path is not None:
+        with Image.open(image_path) as image:
+            image_size = image.size
+
+    image = image_path if image_path is not None else _file_stem(label_path)
+    bbox_ids = [f"bbox-{i}" for i in range(len(labels))]
+    return LabeledImage(
+        image, image_size, _detection_record(values[:, 1:], "REL_CXYWH", labels, label_list, bbox_ids, image_size)
+    )
+
+
+def read_yolo(
+    label_dir: str,
+    label_list: Optional[Sequence[str]] = None,
+    image_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> Iterator[LabeledImage]:
+    """
+    Read a directory of YOLO label files (one "class cx cy w h" line per bbox, relative to the image size).
+
+    Files are parsed in parallel, a bounded number at a time, and yielded in file name order.
+    Bboxes are kept in "REL_CXYWH" format, which the components convert to their `bbox_format`.
+
+    Args:
+    label_dir (str): Directory of the .txt label files.
+    label_list (Sequence[str], optional): Names of the class indices.
+    image_dir (str, optional): Directory of the images, matched to label files by name. If given, images
+        are identified by their path and their sizes are read from the file headers; otherwise images
+        are identified by the name of the label file and have no size.
+    max_workers (int, optional): Number of threads or processes; defaults to the number of CPUs.
+    use_processes (bool, optional): Parse in a process pool instead of a thread pool. Threads are enough for
+        small label files, and are safe to start from a Streamlit app.
+
+    Returns:
+    Iterator[LabeledImage]: The annotations of each image.
+    """
+    image_files = _image_files(image_dir)
+    files = (
+        (os.path.join(label_dir, name), image_files.get(os.path.splitext(name)[0]) if image_dir else None)
+        for name in _list_files(label_dir, (".txt",))
+        if name != "classes.txt"
+    )
+    return _parallel_map(partial(_read_yolo_file, label_list=label_list), files, max_workers, use_processes)
+
+
+def _write_yolo_file(item: LabeledImage, label_dir: str, label_list: Sequence[str]) -> None:
+    lines = []
+    if item.detection is not None:
+        bboxes = _absolute_bboxes(item, "REL_CXYWH")
+        labels = _record_labels(item.detection, label_list)
+        lines = [f"{label} {x:.6f} {y:.6f} {w:.6f} {h:.6f}" for label, (x, y, w, h) in zip(labels, bboxes.tolist())]
+    with open(os.path.join(label_dir, _file_stem(item.image) + ".txt"), "w") as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def write_yolo(
+    label_dir: str,
+    images: Iterable[LabeledImage],
+    label_list: Sequence[str],
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> int:
+    """
+    Write bboxes as YOLO label files, one per image and named after it, plus a classes.txt of `label_list`.
+
+    Args:
+    label_dir (str): Directory to write the label files to, created if needed.
+    images (Iterable[LabeledImage]): Annotated images, e.g. from `stored_images` or one of the readers.
+        Their `image_size` is required unless the bboxes are in a relative format.
+    label_list (Sequence[str]): Labels of the annotations, written as class indices.
+    max_workers (int, optional): Number of threads or processes; defaults to the number of CPUs.
+    use_processes (bool, optional): Write in a process pool instead of a thread pool.
+
+    Returns:
+    int: The number of label files written.
+    """
+    os.makedirs(label_dir, exist_ok=True)
+    with open(os.path.join(label_dir, "classes.txt"), "w") as f:
+        f.write("".join(name + "\n" for name in label_list))
+
+    write = partial(_write_yolo_file, label_dir=label_dir, label_list=label_list)
+    return sum(1 for _ in _parallel_map(write, images, max_workers, use_processes))
+
+
+# Pascal VOC
+
+def _read_voc_file(path: str, label_list: Sequence[str], image_dir: Optional[str]) -> LabeledImage:
+    root = ET.parse(path).getroot()
+    filename = root.findtext("filename") or _file_stem(path)
+    image = filename if image_dir is None else os.path.join(image_dir, filename)
+    size = root.find("size")
+    image_size = (int(size.findtext("width")), int(size.findtext("height"))) if size is not None else None
+
+    bboxes, labels = [], []
+    for obj in root.iter("object"):
+        name = obj.findtext("name")
+        box = obj.find("bndbox")
+        if name not in label_list or box is None:
+            continue
+        bboxes.append([float(box.findtext(tag)) for tag in ("xmin", "ymin", "xmax", "ymax")])
+        labels.append(label_list.index(name))
+
+    bbox_ids = [f"bbox-{i}" for i in range(len(labels))]
+    return LabeledImage(image, image_size, _detection_record(bboxes, "XYXY", labels, label_list, bbox_ids, image_size))
+
+
+def read_voc(
+    annotation_dir: str,
+    label_list: Sequence[str],
+    image_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> Iterator[LabeledImage]:
+    """
+    Read a directory of Pascal VOC xml files.
+
+    Files are parsed in parallel, a bounded number at a time, and yielded in file name order.
+    Bboxes are kept in "XYXY" format.
+
+    Args:
+    annotation_dir (str): Directory of the .xml files.
+    label_list (Sequence[str]): Labels the object names are mapped to; objects with other names are skipped.
+    image_dir (str, optional): Directory prepended to the `filename` of each image.
+    max_workers (int, optional): Number of threads or processes; defaults to the number of CPUs.
+    use_processes (bool, optional): Parse in a process pool instead of a thread pool. Threads are enough for
+        small label files, and are safe to start from a Streamlit app.
+
+    Returns:
+    Iterator[LabeledImage]: The annotations of each image.
+    """
+    files = (os.path.join(annotation_dir, name) for name in _list_files(annotation_dir, (".xml",)))
+    read = partial(_read_voc_file, label_list=list(label_list), image_dir=image_dir)
+    return _parallel_map(read, files, max_workers, use_processes)
+
+
+def _write_voc_file(item: LabeledImage, annotation_dir: str, label_list: Sequence[str]) -> None:
+    if item.image_size is None:
+        raise ValueError(f"The size of image {item.image!r} is required to write Pascal VOC")
+    root = ET.Element("annotation")
+    ET.SubElement(root, "filename").text = os.path.basename(item.image)
+    size = ET.SubElement(root, "size")
+    ET.SubElement(size, "width").text = str(item.image_size[0])
+    ET.SubElement(size, "height").text = str(item.image_size[1])
+    ET.SubElement(size, "depth").text = "3"
+
+    if item.detection is not None:
+        bboxes = np.rint(_absolute_bboxes(item, "XYXY")).astype(int)
+        for label, bbox in zip(_record_labels(item.detection, label_list), bboxes.tolist()):
+            obj = ET.SubElement(root, "object")
+            ET.SubElement(obj, "name").text = label_list[label]
+            ET.SubElement(obj, "difficult").text = "0"
+            box = ET.SubElement(obj, "bndbox")
+            for tag, value in zip(("xmin", "ymin", "xmax", "ymax"), bbox):
+                ET.SubElement(box, tag).text = str(value)
+
+    ET.ElementTree(root).write(os.path.join(annotation_dir, _file_stem(item.image) + ".xml"), encoding="utf-8")
+
+
+def write_voc(
+    annotation_dir: str,
+    images: Iterable[LabeledImage],
+    label_list: Sequence[str],
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> int:
+    """
+    Write bboxes as Pascal VOC xml files, one per image and named after it.
+
+    Args:
+    annotation_dir (str): Directory to write the xml files to, created if needed.
+    images (Iterable[LabeledImage]): Annotated images, e.g. from `stored_images` or one of the readers.
+        Their `image_size` is required.
+    label_list (Sequence[str]): Labels of the annotations, written as object names.
+    max_workers (int, optional): Number of threads or processes; defaults to the number of CPUs.
+    use_processes (bool, optional): Write in a process pool instead of a thread pool.
+
+    Returns:
+    int: The number of xml files written.
+    """
+    os.makedirs(annotation_dir, exist_ok=True)
+    write = partial(_write_voc_file, annotation_dir=annotation_dir, label_list=label_list)
+    return sum(1 for _ in _parallel_map(write, images, max_workers, use_processes))
+
+
+# AnnotationStore
+
+def import_annotations(store: AnnotationStore, images: Iterable[LabeledImage]) -> int:
+    """
+    Write annotated images, e.g. from one of the readers, to `store`, replacing their previous records.
+
+    An image yielded more than once (see `read_coco`) has its annotations merged.
+
+    Returns:
+    int: The number of images imported.
+    """
+    imported = set()
+    for item in images:
+        for kind, record in (("detection", item.detection), ("segmentation", item.segmentation)):
+            if record is None:
+                continue
+            if item.image in imported:
+                previous = store.get(item.image, kind)
+                if previous is not None:
+                    record = _merge_records(previous, record, kind, item)
+            store.put(item.image, kind, record)
+        imported.add(item.image)
+    store.flush()
+    return len(imported)
+
+
+def _merge_records(previous: dict, record: dict, kind: str, item: LabeledImage) -> dict:
+    merged = dict(previous)
+    if kind == "detection":
+        bboxes = _absolute_bboxes(item, previous["bbox_format"])
+        merged["bboxes"] = np.concatenate([np.asarray(previous["bboxes"], dtype=float).reshape(-1, 4), bboxes])
+        fields = ("bbox_ids", "labels", "label_names", "meta_data", "info_dict")
+    else:
+        fields = ("masks", "mask_ids", "labels", "label_names", "meta_data", "info_dict")
+    for field in fields:
+        if previous.get(field) is not None and record.get(field) is not None:
+            merged[field] = list(previous[field]) + list(record[field])
+        else:
+            merged[field] = None
+    return merged
+
+
+def stored_images(store: AnnotationStore) -> Iterator[LabeledImage]:
+    """
+    Iterate over the annotated images in `store`, reading one record at a time, e.g. to pass to a writer.
+    """
+    for image_id in store.image_ids():
+        detection = store.get(image_id, "detection")
+        segmentation = store.get(image_id, "segmentation")
+        image_size = next(
+            (tuple(record["image_size"]) for record in (detection, segmentation) if record and record.get("image_size")),
+            None,
+        )
+        if detection is not None or segmentation is not None:
+            yield LabeledImage(image_id, image_size, detection, segmentation)
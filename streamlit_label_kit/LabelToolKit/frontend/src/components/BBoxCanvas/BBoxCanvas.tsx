@@ -1,8 +1,10 @@
-import React, { useState, useEffect, useCallback } from "react"
+import React, { useState, useEffect, useCallback, useMemo } from "react"
 import { Layer, Rect, Stage, Image } from 'react-konva';
 import {BBox} from '../BBox'
+import {TileLayer} from '../TileLayer'
 import Konva from 'konva';
 import {Rectangle} from "../../utils/Rectangle";
+import {TileInfo, MAX_PIXEL_SCALE, visibleTiles} from "../../utils/Tiles";
 
 export interface BBoxCanvasLayerProps {
   rectangles: Rectangle[],
@@ -20,10 +22,21 @@ export interface BBoxCanvasLayerProps {
   readOnly?: boolean,
   showLabel?: boolean,
   showAdditional?: boolean,
+  tileInfo?: TileInfo | null,
+  onRequestTiles?: (keys: string[]) => void,
 }
 
 const MIN_SIZE = 5;
 const MOVE_PIXEL = 5;
+const ZOOM_STEP = 1.25;
+const TILE_REQUEST_DELAY = 200;
+
+// Zoom factor over `scale` and pan offset in screen pixels, only changed in tiled mode
+interface View {
+  zoom: number,
+  x: number,
+  y: number,
+}
 const KEY_NAMES = new Set<string>([
   "ArrowLeft", "ArrowRight", "ArrowUp", "ArrowDown", "Delete", "Escape",
 ])
@@ -45,20 +58,84 @@ export const BBoxCanvas = (props: BBoxCanvasLayerProps) => {
     readOnly = false,
     showLabel = false,
     showAdditional = false,
+    tileInfo = null,
+    onRequestTiles,
   }: BBoxCanvasLayerProps = props
   const [adding, setAdding] = useState<number[] | null>(null)
-  
+  const [view, setView] = useState<View>({ zoom: 1, x: 0, y: 0 })
+  const [panning, setPanning] = useState<{ clientX: number, clientY: number, view: View } | null>(null)
+
+  // Rectangles are in image pixels; the stage shows them at viewScale, shifted by the pan offset
+  const viewScale = scale * view.zoom;
+  const stageWidth = image_size[0] * scale;
+  const stageHeight = image_size[1] * scale;
+
+  const clampView = useCallback((next: View): View => {
+    return {
+      zoom: next.zoom,
+      x: Math.min(Math.max(next.x, 0), stageWidth * next.zoom - stageWidth),
+      y: Math.min(Math.max(next.y, 0), stageHeight * next.zoom - stageHeight),
+    };
+  }, [stageWidth, stageHeight]);
+
+  // Reset the view when the image or the size of the canvas changes
+  useEffect(() => {
+    setView({ zoom: 1, x: 0, y: 0 });
+  }, [tileInfo === null, image_size[0], image_size[1], scale]);
+
+  // Pointer position in the coordinates of the (panned) layers
+  const layerPointer = useCallback((e: Konva.KonvaEventObject<MouseEvent>) => {
+    const pointer = e.target.getStage()?.getPointerPosition();
+    return pointer ? { x: pointer.x + view.x, y: pointer.y + view.y } : null;
+  }, [view]);
+
   const handleDeselect = useCallback((e: Konva.KonvaEventObject<MouseEvent>) => {
     if (!(e.target instanceof Konva.Rect)) {
       setSelectedId(null);
       if (mode === 'Transform' && !readOnly) {
-        const pointer = e.target.getStage()?.getPointerPosition();
+        const pointer = layerPointer(e);
         if (pointer) {
           setAdding([pointer.x, pointer.y, pointer.x, pointer.y]);
         }
       }
     }
-  }, [mode, setSelectedId, setAdding, readOnly]);
+  }, [mode, setSelectedId, setAdding, readOnly, layerPointer]);
+
+  const handleWheel = (e: Konva.KonvaEventObject<WheelEvent>) => {
+    if (!tileInfo) return;
+    e.evt.preventDefault();
+    const pointer = e.target.getStage()?.getPointerPosition();
+    if (!pointer) return;
+
+    const maxZoom = Math.max(1, MAX_PIXEL_SCALE / scale);
+    const zoom = Math.min(Math.max(view.zoom * (e.evt.deltaY < 0 ? ZOOM_STEP : 1 / ZOOM_STEP), 1), maxZoom);
+
+    // Keep the image point under the pointer in place
+    const ratio = zoom / view.zoom;
+    setView(clampView({
+      zoom,
+      x: (pointer.x + view.x) * ratio - pointer.x,
+      y: (pointer.y + view.y) * ratio - pointer.y,
+    }));
+  };
+
+  // Tiles at the resolution of the current view, when the overview image is not detailed enough
+  const tiles = useMemo(() => {
+    if (!tileInfo || !image || viewScale <= image.width / image_size[0]) return [];
+    return visibleTiles(
+      tileInfo, image_size, viewScale,
+      view.x / viewScale, view.y / viewScale,
+      (view.x + stageWidth) / viewScale, (view.y + stageHeight) / viewScale,
+    );
+  }, [tileInfo, image, image_size, view, viewScale, stageWidth, stageHeight]);
+
+  // Ask for the missing tiles once the view settles
+  useEffect(() => {
+    if (!tileInfo || !onRequestTiles || tiles.every(tile => tileInfo.urls[tile.key])) return;
+
+    const timer = window.setTimeout(() => onRequestTiles(tiles.map(tile => tile.key)), TILE_REQUEST_DELAY);
+    return () => window.clearTimeout(timer);
+  }, [tiles, tileInfo, onRequestTiles]);
 
   const handleKeyInteraction = useCallback((e: KeyboardEvent) => {
     if (e.type !== "keydown") {
@@ -83,23 +160,23 @@ export const BBoxCanvas = (props: BBoxCanvasLayerProps) => {
           setSelectedId(null);
           break;
         case "ArrowRight":
-          rects[index].x += MOVE_PIXEL / scale;
+          rects[index].x += MOVE_PIXEL / viewScale;
           break;
         case "ArrowLeft":
-          rects[index].x -= MOVE_PIXEL / scale;
+          rects[index].x -= MOVE_PIXEL / viewScale;
           break;
         case "ArrowUp":
-          rects[index].y -= MOVE_PIXEL / scale;
+          rects[index].y -= MOVE_PIXEL / viewScale;
           break;
         case "ArrowDown":
-          rects[index].y += MOVE_PIXEL / scale;
+          rects[index].y += MOVE_PIXEL / viewScale;
           break;
       }
 
       setRectangles(rects);
     }
     e.preventDefault();
-  }, [rectangles, selectedId, setRectangles, setSelectedId, scale, readOnly]);
+  }, [rectangles, selectedId, setRectangles, setSelectedId, viewScale, readOnly]);
 
   useEffect(() => {
     const rects = rectangles.slice();
@@ -143,30 +220,54 @@ export const BBoxCanvas = (props: BBoxCanvasLayerProps) => {
 
   return (
     <Stage 
-      width={image_size[0] * scale} 
-      height={image_size[1] * scale}
-      onMouseDown={handleDeselect}
+      width={stageWidth} 
+      height={stageHeight}
+      onMouseDown={(e: any) => {
+        // In tiled mode, the right and middle buttons pan the view
+        if (tileInfo && e.evt.button !== 0) {
+          setPanning({ clientX: e.evt.clientX, clientY: e.evt.clientY, view });
+          return;
+        }
+        handleDeselect(e);
+      }}
+      onWheel={handleWheel}
+      onContextMenu={(e: any) => {
+        if (tileInfo) e.evt.preventDefault();
+      }}
       onMouseMove={(e: any) => {
+        if (panning) {
+          setView(clampView({
+            zoom: panning.view.zoom,
+            x: panning.view.x - (e.evt.clientX - panning.clientX),
+            y: panning.view.y - (e.evt.clientY - panning.clientY),
+          }));
+          return;
+        }
         if (adding && !readOnly) {
-          const pointer = e.target.getStage()?.getPointerPosition()
+          const pointer = layerPointer(e)
           if (pointer){
             setAdding([adding[0], adding[1], pointer.x, pointer.y])
           }
         }
       }}
       onMouseLeave={(e: any) => {
+        setPanning(null);
         if (!readOnly) {
           setAdding(null);
         }
       }}
       onMouseUp={(e: any) => {
+        if (panning) {
+          setPanning(null);
+          return;
+        }
         if (!readOnly) {
-          if (adding && Math.abs((adding[2] - adding[0]) / scale) >= MIN_SIZE && Math.abs((adding[3] - adding[1]) / scale) >= MIN_SIZE) {
+          if (adding && Math.abs((adding[2] - adding[0]) / viewScale) >= MIN_SIZE && Math.abs((adding[3] - adding[1]) / viewScale) >= MIN_SIZE) {
             const newRect = {
-              x: adding[0] / scale,
-              y: adding[1] / scale,
-              width: (adding[2] - adding[0]) / scale,
-              height: (adding[3] - adding[1]) / scale,
+              x: adding[0] / viewScale,
+              y: adding[1] / viewScale,
+              width: (adding[2] - adding[0]) / viewScale,
+              height: (adding[3] - adding[1]) / viewScale,
               label,
               id: Date.now().toString().slice(-8),
               stroke: color_map[label],
@@ -179,16 +280,17 @@ export const BBoxCanvas = (props: BBoxCanvasLayerProps) => {
       }}}
       >
         
-      <Layer>
-        <Image image={image} scaleX={scale} scaleY={scale} />
+      <Layer x={-view.x} y={-view.y}>
+        <Image image={image} width={image_size[0] * viewScale} height={image_size[1] * viewScale} />
+        {tileInfo ? <TileLayer tiles={tiles} urls={tileInfo.urls} scale={viewScale} /> : null}
       </Layer>
-      <Layer>
+      <Layer x={-view.x} y={-view.y}>
         {rectangles.map((rect, i) => {
           return (
             <BBox
               key={i}
               rectProps={rect}
-              scale={scale}
+              scale={viewScale}
               fill={0.3}
               strokeWidth={strokeWidth}
               readOnly={readOnly}
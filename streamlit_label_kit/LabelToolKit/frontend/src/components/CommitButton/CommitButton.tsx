@@ -0,0 +1,31 @@
+import * as React from 'react';
+import Button from '@mui/material/Button';
+import SaveIcon from '@mui/icons-material/Save';
+import { BaseComponentProps } from '../../utils/BaseComponent';
+
+interface CommitButtonProps extends BaseComponentProps {
+  pending?: boolean;
+  onCommit?: () => void;
+  disabled?: boolean;
+}
+
+export function CommitButton({
+  pending = false,
+  onCommit,
+  width = "100%",
+  height = "32px",
+  disabled = false,
+}: CommitButtonProps) {
+  return (
+    <Button
+      variant={pending ? "contained" : "outlined"}
+      size="small"
+      startIcon={<SaveIcon />}
+      onClick={onCommit}
+      disabled={disabled || !pending}
+      sx={{ width: width, height: height }}
+    >
+      Save
+    </Button>
+  );
+}
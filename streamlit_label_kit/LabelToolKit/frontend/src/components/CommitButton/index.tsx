@@ -0,0 +1 @@
+export {CommitButton} from "./CommitButton"
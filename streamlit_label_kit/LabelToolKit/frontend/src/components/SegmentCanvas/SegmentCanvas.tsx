@@ -1,8 +1,9 @@
 
 // USING CIRCLE, MATRIX
-import React, { useState, useEffect, useCallback} from 'react';
+import React, { useState, useEffect, useCallback, useMemo, useRef} from 'react';
 import { Stage, Layer, Rect, Image, Circle} from 'react-konva';
 import {Mask} from '../../utils/Mask';
+import {buildLabelMap, compositeLabelMap, compositeLabelMapRect, packRGBA, updateLabelMapRect} from '../../utils/MaskCompositor';
 
 
 const KEY_NAMES = new Set<string>([
@@ -76,6 +77,11 @@ export const SegmentCanvas = ({
   const [cursor, setCursor] = useState<number[]>([0,0]);
   const [click, setClick] = useState<number[]>([0,0]);
 
+  // Overlay being painted on during a brush stroke, and whether the stroke still has to be committed
+  const overlay = useRef<{ ctx: CanvasRenderingContext2D, imageData: ImageData, lut: Uint32Array } | null>(null);
+  const overlayNode = useRef<any>(null);
+  const strokePending = useRef(false);
+
   const converter = new HexToRgbConverter();
 
   const handleMouseDown = (e: any) => {
@@ -97,6 +103,14 @@ export const SegmentCanvas = ({
 
   const handleMouseUp = () => {
     setDrawing(false);
+    commitStroke();
+  };
+
+  // Masks are edited in place while brushing; hand them to React once per stroke
+  const commitStroke = () => {
+    if (!strokePending.current) return;
+    strokePending.current = false;
+    setMasks && setMasks([...masks]);
   };
 
   const handleKeyInteraction = useCallback((e: KeyboardEvent) => {
@@ -126,6 +140,12 @@ export const SegmentCanvas = ({
     e.preventDefault();
   }, [masks, selectedId, setSelectedId, handleDelete, mode, readOnly]);
 
+  // Top-most mask per pixel; only rebuilt when the masks change, not on selection or mode changes
+  const labelMap = useMemo(
+    () => buildLabelMap(masks, image_size[0], image_size[1]),
+    [masks, image_size]
+  );
+
   const createImageFromMask = (masks: Mask[]) => {
     
     const width = image_size[0];
@@ -135,36 +155,27 @@ export const SegmentCanvas = ({
     canvas.width = width;
     canvas.height = height;
     const ctx = canvas.getContext('2d');
+    overlay.current = null;
 
     if (masks.length === 0) return canvas;
 
     if (ctx) {
       const imageData = ctx.createImageData(width, height);
-      let data = imageData.data;
       
       const default_opacity = (mode === "display") ? 127 : 64;
       const selected_opacity = (mode === "display") ? 180 : 127;
-   
-      for (let y = 0; y < height; y++) {
-        for (let x = 0; x < width; x++) {
-          const index = (y * width + x) * 4;
-          masks.map((mask) => {
-            const color = color_map[mask.label] || '#FFFFFF';
-            const { r, g, b } = converter.hexToRgb(color);
-            
-            const opacity = (selectedId === mask.id) ? selected_opacity : default_opacity;
-            if (mask.data[y][x]) {
-              data[index] = r;     // Red
-              data[index + 1] = g; // Green
-              data[index + 2] = b; // Blue
-              data[index + 3] = opacity;
-            } 
-          });
-        } 
 
-      }
-      // Streamlit.setComponentValue(default_opacity);
+      const lut = new Uint32Array(masks.length + 1);
+      masks.forEach((mask, i) => {
+        const color = color_map[mask.label] || '#FFFFFF';
+        const { r, g, b } = converter.hexToRgb(color);
+        const opacity = (selectedId === mask.id) ? selected_opacity : default_opacity;
+        lut[i + 1] = packRGBA(r, g, b, opacity);
+      });
+
+      compositeLabelMap(labelMap, lut, imageData);
       ctx.putImageData(imageData, 0, 0);
+      overlay.current = { ctx, imageData, lut };
       return canvas;
     }
     return null;
@@ -184,7 +195,7 @@ export const SegmentCanvas = ({
       window.removeEventListener('keyup', handleKeyInteraction);
 
     };
-  }, [masks, image_size, mode, selectedId, click, handleKeyInteraction]);
+  }, [masks, labelMap, image_size, mode, selectedId, click, handleKeyInteraction]);
 
   const updateClick = (e: any) => {
     const stage = e.target.getStage();
@@ -196,17 +207,8 @@ export const SegmentCanvas = ({
 
     if (masks.length === 0) return;
 
-    let selected = false;
-    masks.map((mask) => {
-      if (mask.data[y][x]) {
-        setSelectedId && setSelectedId(mask.id);
-        selected = true;
-      }
-    });
-
-    if (!selected) {
-      setSelectedId && setSelectedId(null);
-    }
+    const label = (x >= 0 && x < image_size[0] && y >= 0 && y < image_size[1]) ? labelMap[y * image_size[0] + x] : 0;
+    setSelectedId && setSelectedId(label ? masks[label - 1].id : null);
   }
 
   const updateCursor = (e: any) => {
@@ -226,15 +228,27 @@ export const SegmentCanvas = ({
     const radius = Math.floor(strokeSize / 2); // Convert diameter to radius
     const radiusSquare = Math.floor(radius * radius);
 
-    let new_masks = [...masks];
-    let index = new_masks.findIndex(new_masks => new_masks.id === selectedId);
+    let index = masks.findIndex(mask => mask.id === selectedId);
     if (index === -1) return;
 
-    const height = new_masks[index].height
-    const width = new_masks[index].width
+    const height = masks[index].height
+    const width = masks[index].width
+
+    const data = masks[index].data;
+    const value = editMode === "pen" ? 1 : 0;
+
+    // Bounding rectangle of the brush, clipped to the image
+    const reach = (strokeSize === 1) ? 0 : radius;
+    const x0 = Math.max(x - reach, 0);
+    const y0 = Math.max(y - reach, 0);
+    const x1 = Math.min(x + reach + 1, width);
+    const y1 = Math.min(y + reach + 1, height);
+    if (x0 >= x1 || y0 >= y1) return;
 
     if (strokeSize === 1) {
-      new_masks[index].data[y][x] = editMode === "pen";
+      if (y >= 0 && y < height && x >= 0 && x < width) {
+        data[y * width + x] = value;
+      }
     } else {
       for (let i = -radius; i <= radius; i++) {
         for (let j = -radius; j <= radius; j++) {
@@ -243,13 +257,13 @@ export const SegmentCanvas = ({
 
           if (strokeShape === "square") {
             if (newY >= 0 && newY < height && newX >= 0 && newX < width) {
-              new_masks[index].data[newY][newX] = editMode === "pen";
+              data[newY * width + newX] = value;
             }
           } else if (strokeShape === "circle") {
             const distSq = i * i + j * j;
             if (distSq < radiusSquare + radius) { // Check if the point is within the circle
               if (newY >= 0 && newY < height && newX >= 0 && newX < width) {
-                new_masks[index].data[newY][newX] = editMode === "pen";
+                data[newY * width + newX] = value;
               }
             }
           }
@@ -257,7 +271,18 @@ export const SegmentCanvas = ({
         }
       }
     }
-    setMasks && setMasks(new_masks);
+    strokePending.current = true;
+
+    // Repaint only the brushed rectangle of the overlay
+    if (overlay.current) {
+      const { ctx, imageData, lut } = overlay.current;
+      updateLabelMapRect(labelMap, masks, index, width, x0, y0, x1, y1);
+      compositeLabelMapRect(labelMap, lut, imageData, x0, y0, x1, y1);
+      ctx.putImageData(imageData, 0, 0, x0, y0, x1 - x0, y1 - y0);
+      overlayNode.current?.getLayer()?.batchDraw();
+    } else {
+      commitStroke();
+    }
   };
 
   return (
@@ -267,10 +292,11 @@ export const SegmentCanvas = ({
       onMouseDown={handleMouseDown} 
       onMouseMove={handleMouseMove} 
       onMouseUp={handleMouseUp}
+      onMouseLeave={commitStroke}
     >
       <Layer>
         <Image image={image} scaleX={scale} scaleY={scale} />
-        {canvasImage && <Image image={canvasImage} scaleX={scale} scaleY={scale} />}
+        {canvasImage && <Image ref={overlayNode} image={canvasImage} scaleX={scale} scaleY={scale} />}
         {(mode !== "display") && (strokeShape === "square"? 
           <Rect 
               x={cursor[1] - (strokeSize / 2)} 
@@ -0,0 +1,38 @@
+import React from "react"
+import { Image } from 'react-konva';
+import useImage from 'use-image';
+import { TilePlacement } from "../../utils/Tiles";
+
+export interface TileLayerProps {
+  tiles: TilePlacement[],
+  urls: { [key: string]: string },
+  scale: number,
+}
+
+const Tile = ({ url, placement, scale }: { url: string, placement: TilePlacement, scale: number }) => {
+  const [image] = useImage(url);
+  if (!image) return null;
+
+  // Edge tiles are smaller than the tile size, so the size is taken from the tile itself
+  return (
+    <Image
+      image={image}
+      x={placement.x * scale}
+      y={placement.y * scale}
+      width={image.width * placement.factor * scale}
+      height={image.height * placement.factor * scale}
+      listening={false}
+    />
+  );
+}
+
+// Draws the tiles that have been served so far; the rest of the view keeps showing the overview image below
+export const TileLayer = ({ tiles, urls, scale }: TileLayerProps) => {
+  return (
+    <React.Fragment>
+      {tiles.filter(tile => urls[tile.key]).map(tile =>
+        <Tile key={tile.key} url={urls[tile.key]} placement={tile} scale={scale} />
+      )}
+    </React.Fragment>
+  );
+}
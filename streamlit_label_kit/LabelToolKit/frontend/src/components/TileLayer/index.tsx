@@ -0,0 +1 @@
+export {TileLayer} from "./TileLayer"
@@ -9,4 +9,6 @@ export {ValueDisplay} from './ValueDisplay'
 export {Description} from './Description'
 export {InputSlider} from './InputSlider'
 export {BrushSelector} from './BrushSelector'
-export {BrushEditor} from './BrushEditor'
\ No newline at end of file
+export {BrushEditor} from './BrushEditor'
+export {CommitButton} from './CommitButton'
+export {TileLayer} from './TileLayer'
\ No newline at end of file
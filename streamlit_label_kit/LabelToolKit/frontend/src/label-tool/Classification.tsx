@@ -6,8 +6,8 @@ import { SelectChangeEvent } from '@mui/material/Select';
 import Stack from '@mui/material/Stack';
 import Box from '@mui/material/Box';
 import useImage from 'use-image';
-import {ClassSelect, ClassRadio, Tag, Description } from '../components';
-import { PythonArgs } from '../utils'
+import {ClassSelect, ClassRadio, Tag, Description, CommitButton } from '../components';
+import { PythonArgs, useCommit, COMMIT_BUTTON_HEIGHT } from '../utils'
 import { CommmonArgs, ClassificationArgs } from "../utils";
 import { Stage, Image, Layer } from 'react-konva';
 
@@ -37,6 +37,8 @@ export const Classification = ( args : PythonArgs) => {
     ui_height,
     read_only = false,
     justify_content = "start",
+    commit_mode = "immediate",
+    commit_delay = 500,
   }: CommmonArgs & ClassificationArgs = args
 
   let left_width: number = 0;
@@ -112,17 +114,23 @@ export const Classification = ( args : PythonArgs) => {
   const [labels, setLabels] = useState<string[]>(default_multi_label_list)
   const [meta, setMeta] = useState<string[]>(meta_info)
 
+  const { setValue, commit, isPending } = useCommit(commit_mode, commit_delay);
+  const commit_height = commit_mode !== "immediate" ? COMMIT_BUTTON_HEIGHT : 0;
+
   const updateMeta = (newMeta: string[]) => {
     setMeta(newMeta)
-    Streamlit.setComponentValue({ 'label': multi_select ? labels : label, 'meta': newMeta, 'key': Date.now().toString().slice(-8)})
+    setValue(() => ({ 'label': multi_select ? labels : label, 'meta': newMeta, 'key': Date.now().toString().slice(-8)}));
   };
 
   const updateDescription = (newDescription: string) => {
     setMeta([newDescription])
-    Streamlit.setComponentValue({ 'label': multi_select ? labels : label, 'meta': [newDescription], 'key': Date.now().toString().slice(-8) })
+    setValue(() => ({ 'label': multi_select ? labels : label, 'meta': [newDescription], 'key': Date.now().toString().slice(-8) }));
   }
 
   useEffect(() => {
+    // Local edits stay authoritative until they are committed
+    if (isPending) return;
+
     setMeta(meta_info);
 
     if (multi_select){
@@ -145,37 +153,37 @@ export const Classification = ( args : PythonArgs) => {
       result = result.filter(i => i !== event.target.name);
     }
     setLabels(result)
-    Streamlit.setComponentValue({ 'label': result, 'meta': meta, 'key': Date.now().toString().slice(-8)})
+    setValue(() => ({ 'label': result, 'meta': meta, 'key': Date.now().toString().slice(-8)}));
   };
 
   const handleChange = (event: SelectChangeEvent<string | string[]>) => {
     const value = event.target.value;
     setLabel(typeof value === 'string' ? value : value.join(', '));
-    Streamlit.setComponentValue({ 'label': value, 'meta': meta, 'key': Date.now().toString().slice(-8) });
+    setValue(() => ({ 'label': value, 'meta': meta, 'key': Date.now().toString().slice(-8) }));
   };
   
   const handleChangeMulti = (event: SelectChangeEvent<string | string[]>) => {
     const value = event.target.value;
     const result = typeof value === 'string' ? value.split(',') : value;
     setLabels(result);
-    Streamlit.setComponentValue({ 'label': result, 'meta': meta, 'key': Date.now().toString().slice(-8) });
+    setValue(() => ({ 'label': result, 'meta': meta, 'key': Date.now().toString().slice(-8) }));
   };
 
 
   useEffect(() => {
     const resizeCanvas = () => {
       if (image_size[0] === 0) {
-        Streamlit.setFrameHeight(UI_HEIGHT);
+        Streamlit.setFrameHeight(UI_HEIGHT + commit_height);
       } else {
         const control_width = left_width + right_width;
         const scale_ratio = (window.innerWidth - control_width) / image_size[0];
         setScale(Math.min(scale_ratio, 1.0));
-        Streamlit.setFrameHeight(image_size[1] * Math.min(scale_ratio, 1.0) + bottom_height);
+        Streamlit.setFrameHeight(image_size[1] * Math.min(scale_ratio, 1.0) + bottom_height + commit_height);
       }
     }
     window.addEventListener('resize', resizeCanvas);
     resizeCanvas()
-  }, [image_size, left_width, right_width, UI_HEIGHT, bottom_height])
+  }, [image_size, left_width, right_width, UI_HEIGHT, bottom_height, commit_height])
 
   let buttom_ui_width: number | string = image_size[0] !== 0 ? image_size[0] * scale : UI_WIDTH ;
 
@@ -319,6 +327,7 @@ export const Classification = ( args : PythonArgs) => {
             </Layer>
           </Stage>
           {(edit_class && class_select_position === "bottom") ? <ClassSelectRender multi={multi_select} marginTop={"10px !important"} width={buttom_ui_width} /> : undefined}
+          {commit_mode !== "immediate" ? <CommitButton pending={isPending} onCommit={commit} width={buttom_ui_width} disabled={read_only} /> : undefined}
         </Stack>
 
         {(right_width !== 0) ? <RenderUi pos={"right"}/> : null}
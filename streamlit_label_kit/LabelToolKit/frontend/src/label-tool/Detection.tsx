@@ -1,13 +1,13 @@
 import {
   Streamlit,
 } from "streamlit-component-lib"
-import React, { useEffect, useState } from "react"
+import React, { useCallback, useEffect, useMemo, useRef, useState } from "react"
 import { SelectChangeEvent } from '@mui/material/Select';
 import Stack from '@mui/material/Stack';
 import Box from '@mui/material/Box';
 import useImage from 'use-image';
-import { BBoxCanvas, ItemList, ClassSelect, ItemInfo, ClassRadio } from '../components';
-import { BaseItem, Rectangle, PythonArgs } from '../utils'
+import { BBoxCanvas, ItemList, ClassSelect, ItemInfo, ClassRadio, CommitButton } from '../components';
+import { BaseItem, Rectangle, PythonArgs, PatchTracker, decodeBBoxColumns, encodeBBoxColumns, useCommit, COMMIT_BUTTON_HEIGHT } from '../utils'
 import { CommmonArgs, DetectionArgs, DevArgs } from "../utils";
 
 const _CLASS_SELECT_HEIGHT = 41 + 6;
@@ -18,7 +18,7 @@ export const Detection = (args: PythonArgs) => {
     image_url,
     image_size,
     label_list = [],
-    bbox_info = [],
+    bbox_info = { bbox: [], label_id: [], id: [] },
     color_map = {},
     line_width = 1.0,
     class_select_type = "select",
@@ -36,6 +36,11 @@ export const Detection = (args: PythonArgs) => {
     bbox_show_additional = false,
     bbox_show_label = false,
     justify_content = "start",
+    transfer_mode = "full",
+    patch_base = null,
+    commit_mode = "immediate",
+    commit_delay = 500,
+    tile_info = null,
   }: CommmonArgs & DetectionArgs & DevArgs = args
 
   let left_width: number = 0;
@@ -117,52 +122,66 @@ export const Detection = (args: PythonArgs) => {
   const baseUrl = new URL(params.get('streamlitUrl') || '').origin + '/'
   const [image] = useImage(baseUrl + image_url)
 
+  // In tiled mode image_size is the original size, and the image above only an overview
+  const tileInfo = useMemo(() => tile_info && {
+    ...tile_info,
+    urls: Object.fromEntries(Object.entries(tile_info.urls).map(([key, url]) => [key, baseUrl + url])),
+  }, [tile_info, baseUrl]);
+
   const [rectangles, setRectangles] = React.useState<Rectangle[]>(
-    bbox_info.map((bb, i) => {
-      return {
-        x: bb.bbox[0],
-        y: bb.bbox[1],
-        width: bb.bbox[2],
-        height: bb.bbox[3],
-        label: bb.label,
-        stroke: color_map[bb.label] || '#000',
-        id: bb.id,
-        meta: bb.meta || [],
-        additional_data: bb.additional_data || {},
-      }
-    }));
+    () => decodeBBoxColumns(bbox_info, label_list, color_map));
   const [selectedId, setSelectedId] = React.useState<string | null>(null);
   const [label, setLabel] = useState<string>(label_list[0])
   const [mode, setMode] = React.useState<string>('Transform');
   const [selectedItem, setSelectedItem] = React.useState<Rectangle | null>(null);
 
+  const { setValue, commit, isPending, sendWith } = useCommit(commit_mode, commit_delay);
+  const requestTiles = useCallback((keys: string[]) => sendWith({ "tiles": keys }), [sendWith]);
+  const commit_height = commit_mode !== "immediate" ? COMMIT_BUTTON_HEIGHT : 0;
+
   const [scale, setScale] = useState(1.0)
   useEffect(() => {
     const resizeCanvas = () => {
       const control_width = left_width + right_width;
       const scale_ratio = (window.innerWidth - control_width) / image_size[0];
       setScale(Math.min(scale_ratio, 1.0));
-      Streamlit.setFrameHeight(image_size[1] * Math.min(scale_ratio, 1.0) + bottom_height);
+      Streamlit.setFrameHeight(image_size[1] * Math.min(scale_ratio, 1.0) + bottom_height + commit_height);
     }
     window.addEventListener('resize', resizeCanvas);
     resizeCanvas()
-  }, [image_size, left_width, right_width, bottom_height])
+  }, [image_size, left_width, right_width, bottom_height, commit_height])
+
+  const toBboxValue = (rect: Rectangle) => {
+    return {
+      bbox: [rect.x, rect.y, rect.width, rect.height],
+      label_id: label_list.indexOf(rect.label),
+      label: rect.label,
+      id: rect.id,
+      meta: rect.meta || [],
+      additional_data: rect.additional_data || {},
+    }
+  }
+
+  // In patch mode, only the bboxes that differ from the last value sent to Python are sent again
+  const patchBase = useRef<string | null | undefined>(undefined);
+  const tracker = useRef(new PatchTracker<ReturnType<typeof toBboxValue>, string>(
+    item => JSON.stringify(item),
+    (item, sent) => JSON.stringify(item) !== sent,
+  ));
 
   const setStreamlitOutput = (rects: Rectangle[]) => {
-    const currentBboxValue = rects.map((rect, i) => {
-      return {
-        bbox: [rect.x, rect.y, rect.width, rect.height],
-        label_id: label_list.indexOf(rect.label),
-        label: rect.label,
-        id: rect.id,
-        meta: rect.meta || [],
-        additional_data: rect.additional_data || {},
+    setValue(() => {
+      if (transfer_mode === "patch") {
+        return {
+          "patch": tracker.current.diff(rects.map(toBboxValue)),
+          "key": Date.now().toString().slice(-8),
+        }
       }
-    })
 
-    Streamlit.setComponentValue({
-      "bbox": currentBboxValue,
-      "key": Date.now().toString().slice(-8),
+      return {
+        "bbox": encodeBBoxColumns(rects, label_list),
+        "key": Date.now().toString().slice(-8),
+      }
     })
   }
 
@@ -190,20 +209,21 @@ export const Detection = (args: PythonArgs) => {
   };
 
   useEffect(() => {
-    const newRectangles = bbox_info.map(bb => ({
-      x: bb.bbox[0],
-      y: bb.bbox[1],
-      width: bb.bbox[2],
-      height: bb.bbox[3],
-      label: bb.label,
-      stroke: color_map[bb.label] || '#000',
-      id: bb.id,
-      meta: bb.meta || [],
-      additional_data: bb.additional_data || {},
-    }));
+    // Local edits stay authoritative until they are committed
+    if (isPending) return;
+
+    // Python keeps applying patches on top of the same inputs, so local edits are kept until they change
+    if (transfer_mode === "patch" && patch_base === patchBase.current) return;
+
+    const newRectangles = decodeBBoxColumns(bbox_info, label_list, color_map);
 
     setRectangles(newRectangles);
 
+    if (transfer_mode === "patch") {
+      patchBase.current = patch_base;
+      tracker.current.reset(patch_base || "", newRectangles.map(toBboxValue));
+    }
+
     if (selectedId !== null) {
       let index = newRectangles.findIndex(rect => rect.id === selectedId);
       if (index !== -1) {
@@ -412,8 +432,11 @@ export const Detection = (args: PythonArgs) => {
             readOnly={read_only}
             showLabel={bbox_show_label}
             showAdditional={bbox_show_additional}
+            tileInfo={tileInfo}
+            onRequestTiles={requestTiles}
           />
           {class_select_position === "bottom" ? <ClassSelectRender marginTop={"10px !important"} width={image_size[0] * scale} /> : undefined}
+          {commit_mode !== "immediate" ? <CommitButton pending={isPending} onCommit={commit} width={image_size[0] * scale} disabled={read_only} /> : undefined}
         </Stack>
 
         {(right_width !== 0) ? <RenderUi pos={"right"} /> : undefined}
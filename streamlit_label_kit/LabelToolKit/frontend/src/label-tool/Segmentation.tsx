@@ -1,7 +1,7 @@
 import {
   Streamlit,
 } from "streamlit-component-lib"
-import React, { useEffect, useState } from "react"
+import React, { useEffect, useRef, useState } from "react"
 import useImage from 'use-image';
 
 import { SelectChangeEvent } from '@mui/material/Select';
@@ -13,18 +13,14 @@ import AddIcon from '@mui/icons-material/Add';
 import SaveIcon from '@mui/icons-material/Save';
 import EditIcon from '@mui/icons-material/Edit';
 
-import { BBoxCanvas, ItemList, ClassSelect, ItemInfo, SegmentCanvas, InputSlider, BrushSelector, BrushEditor } from '../components';
-import { BaseItem, Rectangle, PythonArgs, Mask } from '../utils'
+import { BBoxCanvas, ItemList, ClassSelect, ItemInfo, SegmentCanvas, InputSlider, BrushSelector, BrushEditor, CommitButton } from '../components';
+import { BaseItem, Rectangle, PythonArgs, Mask, createEmptyMask, decodeMask, encodeMask, removeMaskOverlap, maskDataEqual, PatchTracker, useCommit, COMMIT_BUTTON_HEIGHT } from '../utils'
 import { CommmonArgs, SegmentationArgs, DevArgs } from "../utils";
 
 const _CLASS_SELECT_HEIGHT = 42 + 6;
 const _SPACE = 8;
 const _SMALL_UI_WIDTH = 196;
 
-const createEmptyMask = (width: number, height: number) => {
-  return Array.from({ length: height }, () => Array<boolean>(width).fill(false));
-}
-
 export const Segmentation = (args: PythonArgs) => {
   const {
     image_url,
@@ -44,8 +40,13 @@ export const Segmentation = (args: PythonArgs) => {
     edit_description = false,
     edit_meta = false,
     auto_seg_mode = false,
+    mask_encoding = "json",
     read_only = false,
     justify_content = "start",
+    transfer_mode = "full",
+    patch_base = null,
+    commit_mode = "immediate",
+    commit_delay = 500,
   }: CommmonArgs & SegmentationArgs & DevArgs = args
 
   let left_width: number = 0;
@@ -125,10 +126,10 @@ export const Segmentation = (args: PythonArgs) => {
   const [rectangles, setRectangles] = React.useState<Rectangle[]>([]);
   const [selectedRectId, setSelectedRectId] = React.useState<string | null>(null);
 
-  const [masks, setMasks] = useState<Mask[]>(
+  const [masks, setMasks] = useState<Mask[]>(() =>
     masks_info.map((mask, i) => {
       return {
-        data: mask.data,
+        data: decodeMask(mask.data, mask_encoding, image_size[0], image_size[1]),
         width: image_size[0],
         height: image_size[1],
         label: mask.label,
@@ -138,22 +139,33 @@ export const Segmentation = (args: PythonArgs) => {
       }
     }));
 
+  const { setValue, commit, isPending } = useCommit(commit_mode, commit_delay);
+  const commit_height = commit_mode !== "immediate" ? COMMIT_BUTTON_HEIGHT : 0;
+
   const [scale, setScale] = useState(1.0)
   useEffect(() => {
     const resizeCanvas = () => {
       const control_width = left_width + right_width;
       const scale_ratio = (window.innerWidth - control_width) / image_size[0];
       setScale(Math.min(scale_ratio, 1.0));
-      Streamlit.setFrameHeight(image_size[1] * Math.min(scale_ratio, 1.0) + bottom_height + 1);
+      Streamlit.setFrameHeight(image_size[1] * Math.min(scale_ratio, 1.0) + bottom_height + commit_height + 1);
     }
     window.addEventListener('resize', resizeCanvas);
     resizeCanvas()
-  }, [image_size, bottom_height, left_width, right_width])
+  }, [image_size, bottom_height, left_width, right_width, commit_height])
+
+  // In patch mode, only the masks that differ from the last value sent to Python are encoded and sent again
+  const maskFields = (mask: Mask) => JSON.stringify([mask.label, mask.meta || [], mask.additional_data || {}]);
+  const patchBase = useRef<string | null | undefined>(undefined);
+  const tracker = useRef(new PatchTracker<Mask, { data: Uint8Array, fields: string }>(
+    mask => ({ data: mask.data.slice(), fields: maskFields(mask) }),
+    (mask, sent) => maskFields(mask) !== sent.fields || !maskDataEqual(mask.data, sent.data),
+  ));
 
   const setStreamlitOutput = (masks_input: Mask[]) => {
-    const currentMask = masks_input.map((mask, i) => {
+    const toMaskValue = (mask: Mask) => {
       return {
-        data: mask.data,
+        data: encodeMask(mask.data, mask_encoding, mask.width, mask.height),
         width: mask.width,
         height: mask.height,
         label_id: label_list.indexOf(mask.label),
@@ -162,7 +174,7 @@ export const Segmentation = (args: PythonArgs) => {
         meta: mask.meta || [],
         additional_data: mask.additional_data || {},
       }
-    })
+    }
 
     const currentBboxValue = rectangles.map((rect, i) => {
       return {
@@ -177,16 +189,38 @@ export const Segmentation = (args: PythonArgs) => {
 
     setRectangles([]);
 
-    Streamlit.setComponentValue({
-      "new": currentBboxValue,
-      "mask": currentMask,
-      "key": Date.now().toString().slice(-8),
+    setValue(() => {
+      if (transfer_mode === "patch") {
+        const patch = tracker.current.diff(masks_input);
+        return {
+          "new": currentBboxValue,
+          "patch": { ...patch, upserted: patch.upserted.map(toMaskValue) },
+          "key": Date.now().toString().slice(-8),
+        }
+      }
+
+      return {
+        "new": currentBboxValue,
+        "mask": masks_input.map(toMaskValue),
+        "key": Date.now().toString().slice(-8),
+      }
     })
+
+    // New bboxes ask Python for auto segmentation, which cannot wait for a commit
+    if (currentBboxValue.length > 0) {
+      commit();
+    }
   }
 
   useEffect(() => {
+    // Local edits stay authoritative until they are committed
+    if (isPending) return;
+
+    // Python keeps applying patches on top of the same inputs, so local edits are kept until they change
+    if (transfer_mode === "patch" && patch_base === patchBase.current) return;
+
     const newMasks = masks_info.map(mask => ({
-      data: mask.data,
+      data: decodeMask(mask.data, mask_encoding, image_size[0], image_size[1]),
       width: image_size[0],
       height: image_size[1],
       label: mask.label,
@@ -196,6 +230,11 @@ export const Segmentation = (args: PythonArgs) => {
     }));
     setMasks(newMasks);
 
+    if (transfer_mode === "patch") {
+      patchBase.current = patch_base;
+      tracker.current.reset(patch_base || "", newMasks);
+    }
+
     if (selectedId !== null) {
       let index = newMasks.findIndex(rect => rect.id === selectedId);
       if (index !== -1) {
@@ -312,17 +351,7 @@ export const Segmentation = (args: PythonArgs) => {
     if (selectedId) {
       let index = _masks.findIndex(mask => mask.id === selectedId);
       if (index !== -1) {
-        const height = image_size[1];
-        const width = image_size[0];
-
-        for (let y = 0; y < height; y++) {
-          for (let x = 0; x < width; x++) {
-            if (masks[index].data[y][x]) {
-              masks.map((mask) => { mask.data[y][x] = false; });
-              masks[index].data[y][x] = true;
-            }
-          }
-        }
+        removeMaskOverlap(_masks, index);
       }
     }
     updateMasks(_masks);
@@ -497,6 +526,7 @@ export const Segmentation = (args: PythonArgs) => {
               {!auto_seg_mode ? <InputSlider value={strokeSize} setValue={setStrokeSize} title={"Size"} minValue={1} maxValue={50} disabled={mode === "display"} /> : null}
             </Stack>
             : undefined}
+          {commit_mode !== "immediate" ? <CommitButton pending={isPending} onCommit={commit} width={image_size[0] * scale} disabled={read_only} /> : undefined}
         </Stack>
 
         {(right_width !== 0) ?
@@ -0,0 +1,71 @@
+import { useCallback, useEffect, useRef, useState } from "react"
+import { Streamlit } from "streamlit-component-lib"
+
+export type CommitMode = "immediate" | "debounce" | "explicit";
+
+// Height reserved below the canvas for the Save button when commits are not immediate
+export const COMMIT_BUTTON_HEIGHT = 32 + 8;
+
+// Sends component values to Python according to the commit mode:
+// "immediate" sends every value, "debounce" sends the latest one after `delay` ms without edits,
+// "explicit" only on commit() (Save button, or Ctrl/Cmd+S). Values are built lazily, when sent.
+export const useCommit = (mode: CommitMode = "immediate", delay: number = 500) => {
+  const pending = useRef<(() => any) | null>(null);
+  const sent = useRef<any>(null);
+  const timer = useRef<number | undefined>(undefined);
+  const [isPending, setIsPending] = useState(false);
+
+  const send = useCallback((value: any) => {
+    sent.current = value;
+    Streamlit.setComponentValue(value);
+  }, []);
+
+  const commit = useCallback(() => {
+    window.clearTimeout(timer.current);
+    timer.current = undefined;
+    const build = pending.current;
+    if (build === null) return;
+
+    pending.current = null;
+    setIsPending(false);
+    send(build());
+  }, [send]);
+
+  const setValue = useCallback((build: () => any) => {
+    if (mode === "immediate") {
+      send(build());
+      return;
+    }
+
+    pending.current = build;
+    setIsPending(true);
+    if (mode === "debounce") {
+      window.clearTimeout(timer.current);
+      timer.current = window.setTimeout(commit, delay);
+    }
+  }, [mode, delay, commit]);
+
+  useEffect(() => {
+    if (mode === "immediate") return;
+
+    const handleKeyDown = (e: KeyboardEvent) => {
+      if ((e.ctrlKey || e.metaKey) && e.key === "s") {
+        e.preventDefault();
+        commit();
+      }
+    };
+    window.addEventListener('keydown', handleKeyDown);
+    return () => window.removeEventListener('keydown', handleKeyDown);
+  }, [mode, commit]);
+
+  // Do not drop edits when the mode changes or the component goes away
+  useEffect(() => commit, [mode, commit]);
+
+  // Sends `extra` fields (e.g. a request for image tiles) right away, along with the last committed value,
+  // leaving pending edits pending. Later values do not repeat the extra fields.
+  const sendWith = useCallback((extra: object) => {
+    Streamlit.setComponentValue({ key: "0", ...sent.current, ...extra });
+  }, []);
+
+  return { setValue, commit, isPending, sendWith };
+}
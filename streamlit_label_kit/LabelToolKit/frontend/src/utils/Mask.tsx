@@ -1,7 +1,53 @@
 import {BaseItem} from "./BaseItem"
 
 export interface Mask extends BaseItem{
-  data: boolean[][];
+  data: Uint8Array;  // row-major, 1 = set, pixel (x, y) at y * width + x
   width: number;
   height: number;
-}
\ No newline at end of file
+}
+
+// Bounding box [x0, y0, x1, y1) of the set pixels of a mask, or null if it is empty
+export const maskBounds = (mask: Mask): number[] | null => {
+  const { data, width, height } = mask;
+  let x0 = width, y0 = height, x1 = 0, y1 = 0;
+  for (let y = 0; y < height; y++) {
+    const row = data.subarray(y * width, (y + 1) * width);
+    const first = row.indexOf(1);
+    if (first === -1) continue;
+    if (y0 === height) y0 = y;
+    y1 = y + 1;
+    x0 = Math.min(x0, first);
+    x1 = Math.max(x1, row.lastIndexOf(1) + 1);
+  }
+  return y1 > y0 ? [x0, y0, x1, y1] : null;
+}
+
+// Clear the pixels of masks[index] from every other mask, touching only its bounding box
+export const removeMaskOverlap = (masks: Mask[], index: number) => {
+  const selected = masks[index];
+  const bounds = maskBounds(selected);
+  if (bounds === null) return;
+
+  const [x0, y0, x1, y1] = bounds;
+  const width = selected.width;
+  const others = masks.filter((_, i) => i !== index).map(mask => mask.data);
+
+  for (let y = y0; y < y1; y++) {
+    const start = y * width + x0;
+    const row = selected.data.subarray(start, y * width + x1);
+    for (const other of others) {
+      const target = other.subarray(start, start + row.length);
+      for (let x = 0; x < row.length; x++) {
+        target[x] &= row[x] ^ 1;
+      }
+    }
+  }
+}
+
+export const maskDataEqual = (a: Uint8Array, b: Uint8Array): boolean => {
+  if (a.length !== b.length) return false;
+  for (let p = 0; p < a.length; p++) {
+    if (a[p] !== b[p]) return false;
+  }
+  return true;
+}
@@ -0,0 +1,67 @@
+import {Mask} from "./Mask"
+
+const LITTLE_ENDIAN = new Uint8Array(new Uint32Array([1]).buffer)[0] === 1;
+
+// Pack a color so that writing it through a Uint32Array view of ImageData yields RGBA bytes
+export const packRGBA = (r: number, g: number, b: number, a: number): number => {
+  return LITTLE_ENDIAN ?
+    ((a << 24) | (b << 16) | (g << 8) | r) >>> 0 :
+    ((r << 24) | (g << 16) | (b << 8) | a) >>> 0;
+}
+
+// 1-based index of the top-most (last) mask covering each pixel, 0 where no mask is set
+export const buildLabelMap = (masks: Mask[], width: number, height: number): Uint16Array => {
+  const labelMap = new Uint16Array(width * height);
+  masks.forEach((mask, i) => {
+    const data = mask.data;
+    const label = i + 1;
+    for (let p = 0; p < data.length; p++) {
+      if (data[p]) labelMap[p] = label;
+    }
+  });
+  return labelMap;
+}
+
+// Fill imageData in a single pass; lut[0] is the background, lut[i + 1] the color of masks[i]
+export const compositeLabelMap = (labelMap: Uint16Array, lut: Uint32Array, imageData: ImageData) => {
+  const out = new Uint32Array(imageData.data.buffer);
+  for (let p = 0; p < labelMap.length; p++) {
+    out[p] = lut[labelMap[p]];
+  }
+}
+
+// Refresh the label map inside [x0, x1) x [y0, y1) after only masks[index] was edited there
+export const updateLabelMapRect = (
+  labelMap: Uint16Array, masks: Mask[], index: number, width: number,
+  x0: number, y0: number, x1: number, y1: number,
+) => {
+  const data = masks[index].data;
+  const label = index + 1;
+  for (let y = y0; y < y1; y++) {
+    for (let p = y * width + x0, end = y * width + x1; p < end; p++) {
+      if (data[p]) {
+        // Painted: shows through unless a later mask already covers the pixel
+        if (labelMap[p] < label) labelMap[p] = label;
+      } else if (labelMap[p] === label) {
+        // Erased: fall back to the top-most earlier mask
+        let below = index - 1;
+        while (below >= 0 && !masks[below].data[p]) below--;
+        labelMap[p] = below + 1;
+      }
+    }
+  }
+}
+
+// Same as compositeLabelMap, restricted to [x0, x1) x [y0, y1) of a full-size imageData
+export const compositeLabelMapRect = (
+  labelMap: Uint16Array, lut: Uint32Array, imageData: ImageData,
+  x0: number, y0: number, x1: number, y1: number,
+) => {
+  const width = imageData.width;
+  const out = new Uint32Array(imageData.data.buffer);
+  for (let y = y0; y < y1; y++) {
+    for (let p = y * width + x0, end = y * width + x1; p < end; p++) {
+      out[p] = lut[labelMap[p]];
+    }
+  }
+}
@@ -0,0 +1,140 @@
+export type MaskEncoding = "json" | "rle" | "packbits";
+
+// COCO run-length encoding: column-major runs, starting with a run of zeros
+export interface RLE {
+  size: number[];
+  counts: number[];
+}
+
+// Row-major pixels packed 1 bit per pixel, most significant bit first (numpy.packbits)
+export interface PackedMask {
+  size: number[];
+  bits: string;
+}
+
+// Masks are held as flat row-major Uint8Arrays (1 = set), pixel (x, y) at index y * width + x
+export const createEmptyMask = (width: number, height: number) => {
+  return new Uint8Array(width * height);
+}
+
+export const jsonToMask = (rows: boolean[][], width: number, height: number): Uint8Array => {
+  const mask = createEmptyMask(width, height);
+  for (let y = 0; y < height; y++) {
+    const row = rows[y];
+    const offset = y * width;
+    for (let x = 0; x < width; x++) {
+      if (row[x]) mask[offset + x] = 1;
+    }
+  }
+  return mask;
+}
+
+export const maskToJson = (mask: Uint8Array, width: number, height: number): boolean[][] => {
+  const rows: boolean[][] = new Array(height);
+  for (let y = 0; y < height; y++) {
+    const row = new Array<boolean>(width);
+    const offset = y * width;
+    for (let x = 0; x < width; x++) {
+      row[x] = mask[offset + x] !== 0;
+    }
+    rows[y] = row;
+  }
+  return rows;
+}
+
+export const rleToMask = (rle: RLE, width: number, height: number): Uint8Array => {
+  const mask = createEmptyMask(width, height);
+
+  let pos = 0;
+  let value = false;
+  for (const count of rle.counts) {
+    if (value) {
+      for (let p = pos; p < pos + count; p++) {
+        mask[(p % height) * width + Math.floor(p / height)] = 1;
+      }
+    }
+    pos += count;
+    value = !value;
+  }
+  return mask;
+}
+
+export const maskToRle = (mask: Uint8Array, width: number, height: number): RLE => {
+  const counts: number[] = [];
+
+  let value = 0;
+  let run = 0;
+  for (let x = 0; x < width; x++) {
+    for (let p = x; p < mask.length; p += width) {
+      if (mask[p] !== value) {
+        counts.push(run);
+        run = 0;
+        value = mask[p];
+      }
+      run++;
+    }
+  }
+  counts.push(run);
+  return { size: [height, width], counts: counts };
+}
+
+const base64ToBytes = (b64: string): Uint8Array => {
+  const binary = atob(b64);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return bytes;
+}
+
+const bytesToBase64 = (bytes: Uint8Array): string => {
+  const CHUNK = 0x8000;
+  let binary = "";
+  for (let i = 0; i < bytes.length; i += CHUNK) {
+    binary += String.fromCharCode.apply(null, Array.from(bytes.subarray(i, i + CHUNK)));
+  }
+  return btoa(binary);
+}
+
+export const packbitsToMask = (packed: PackedMask, width: number, height: number): Uint8Array => {
+  const bytes = base64ToBytes(packed.bits);
+  const mask = createEmptyMask(width, height);
+
+  for (let p = 0; p < mask.length; p++) {
+    mask[p] = (bytes[p >> 3] >> (7 - (p & 7))) & 1;
+  }
+  return mask;
+}
+
+export const maskToPackbits = (mask: Uint8Array, width: number, height: number): PackedMask => {
+  const bytes = new Uint8Array(Math.ceil(width * height / 8));
+
+  for (let p = 0; p < mask.length; p++) {
+    if (mask[p]) {
+      bytes[p >> 3] |= 0x80 >> (p & 7);
+    }
+  }
+  return { size: [height, width], bits: bytesToBase64(bytes) };
+}
+
+export const decodeMask = (data: any, encoding: MaskEncoding, width: number, height: number): Uint8Array => {
+  switch (encoding) {
+    case "rle":
+      return rleToMask(data, width, height);
+    case "packbits":
+      return packbitsToMask(data, width, height);
+    default:
+      return jsonToMask(data, width, height);
+  }
+}
+
+export const encodeMask = (mask: Uint8Array, encoding: MaskEncoding, width: number, height: number): any => {
+  switch (encoding) {
+    case "rle":
+      return maskToRle(mask, width, height);
+    case "packbits":
+      return maskToPackbits(mask, width, height);
+    default:
+      return maskToJson(mask, width, height);
+  }
+}
@@ -0,0 +1,52 @@
+export type TransferMode = "full" | "patch";
+
+// Items added, modified or deleted since the previous value, applied in Python to a session-cached copy
+export interface Patch<T> {
+  base: string;           // digest of the inputs the patch applies to
+  revision: number;       // increases with every patch, so Python applies each one once
+  upserted: T[];
+  deleted: string[];
+  order: string[] | null; // full id order, only sent when it differs from the order of applying the patch
+}
+
+// Remembers what was last sent for each item id, so that only changed items are sent again
+export class PatchTracker<T extends { id: string }, S> {
+  private sent = new Map<string, S>();
+  private base = "";
+  private revision = 0;
+
+  constructor(
+    private snapshot: (item: T) => S,
+    private changed: (item: T, sent: S) => boolean,
+  ) {}
+
+  reset(base: string, items: T[]) {
+    this.base = base;
+    this.sent = new Map(items.map(item => [item.id, this.snapshot(item)]));
+  }
+
+  diff(items: T[]): Patch<T> {
+    const current = new Set(items.map(item => item.id));
+    const deleted = Array.from(this.sent.keys()).filter(id => !current.has(id));
+    deleted.forEach(id => this.sent.delete(id));
+
+    const upserted = items.filter(item => {
+      const sent = this.sent.get(item.id);
+      return sent === undefined || this.changed(item, sent);
+    });
+    upserted.forEach(item => this.sent.set(item.id, this.snapshot(item)));
+
+    // Existing ids keep their position and new ones are appended, unless the order says otherwise
+    const ids = items.map(item => item.id);
+    const expected = Array.from(this.sent.keys());
+    let order: string[] | null = null;
+    if (ids.length !== expected.length || ids.some((id, i) => id !== expected[i])) {
+      order = ids;
+      this.sent = new Map(ids.map(id => [id, this.sent.get(id) as S]));
+    }
+
+    // Seeded from the clock so that revisions keep increasing when the component is reloaded
+    this.revision = Math.max(this.revision + 1, Date.now());
+    return { base: this.base, revision: this.revision, upserted, deleted, order };
+  }
+}
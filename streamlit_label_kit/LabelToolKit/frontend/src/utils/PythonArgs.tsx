@@ -1,3 +1,6 @@
+import {BBoxColumns} from "./Rectangle"
+import {TileInfo} from "./Tiles"
+
 export type PythonArgs = CommmonArgs & DetectionArgs & ClassificationArgs & DevArgs;
 
 export interface CommmonArgs {
@@ -7,6 +10,10 @@ export interface CommmonArgs {
   read_only?: boolean,
   label_type: "annotation" | "detection" | "segmentation"
   justify_content?: "center" | "start" | "end"
+  transfer_mode?: "full" | "patch",
+  patch_base?: string | null,
+  commit_mode?: "immediate" | "debounce" | "explicit",
+  commit_delay?: number,
 };
 
 export interface DevArgs {
@@ -24,18 +31,20 @@ export interface DevArgs {
 };
 
 export interface DetectionArgs {
-  bbox_info?: any[],
+  bbox_info?: BBoxColumns,
   additional_bbox?: any[],
   color_map?: any,
   line_width?: number,
   bbox_show_additional?: boolean,
   bbox_show_label?: boolean,
+  tile_info?: TileInfo | null,
 }
 
 export interface SegmentationArgs {
   masks_info?: any[],
   color_map?: any,
   auto_seg_mode?: boolean,
+  mask_encoding?: "json" | "rle" | "packbits",
 }
 
 export interface ClassificationArgs {
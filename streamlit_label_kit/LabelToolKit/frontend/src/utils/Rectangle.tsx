@@ -6,4 +6,56 @@ export interface Rectangle extends BaseItem{
   width: number;
   height: number;
   stroke: any;
-}
\ No newline at end of file
+}
+
+// Columnar transport of bboxes between Python and the frontend: parallel arrays, labels as indices
+// into label_list, and meta / additional_data only for the bboxes that have them, keyed by index
+export interface BBoxColumns {
+  bbox: number[];  // x, y, width, height of each bbox, flattened
+  label_id: number[];  // -1 for labels not in label_list, which are sent in `label`
+  id: string[];
+  label?: { [index: string]: string };
+  meta?: { [index: string]: string[] };
+  additional_data?: { [index: string]: {} };
+}
+
+export const decodeBBoxColumns = (columns: BBoxColumns, label_list: string[], color_map: any): Rectangle[] => {
+  const { bbox, label_id, id, meta = {}, additional_data = {} } = columns;
+  return id.map((rect_id, i) => {
+    const label = label_list[label_id[i]];
+    return {
+      x: bbox[4 * i],
+      y: bbox[4 * i + 1],
+      width: bbox[4 * i + 2],
+      height: bbox[4 * i + 3],
+      label: label,
+      stroke: color_map[label] || '#000',
+      id: rect_id,
+      meta: meta[i] || [],
+      additional_data: additional_data[i] || {},
+    }
+  });
+}
+
+export const encodeBBoxColumns = (rects: Rectangle[], label_list: string[]): BBoxColumns => {
+  const columns: BBoxColumns = {
+    bbox: new Array(4 * rects.length),
+    label_id: new Array(rects.length),
+    id: new Array(rects.length),
+    meta: {},
+    label: {},
+    additional_data: {},
+  };
+  rects.forEach((rect, i) => {
+    columns.bbox[4 * i] = rect.x;
+    columns.bbox[4 * i + 1] = rect.y;
+    columns.bbox[4 * i + 2] = rect.width;
+    columns.bbox[4 * i + 3] = rect.height;
+    columns.label_id[i] = label_list.indexOf(rect.label);
+    if (columns.label_id[i] < 0) columns.label![i] = rect.label;
+    columns.id[i] = rect.id;
+    if (rect.meta && rect.meta.length > 0) columns.meta![i] = rect.meta;
+    if (rect.additional_data && Object.keys(rect.additional_data).length > 0) columns.additional_data![i] = rect.additional_data;
+  });
+  return columns;
+}
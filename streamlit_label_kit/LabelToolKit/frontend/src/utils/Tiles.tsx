@@ -0,0 +1,45 @@
+// Tile pyramid of an image too large to send at once. Level 0 is the full resolution image and every further
+// level halves it; Python only serves (and sends urls for) the tiles the frontend asked for.
+export interface TileInfo {
+  tile_size: number;
+  levels: number;
+  urls: { [key: string]: string }; // "level/col/row" -> url
+}
+
+// Position of a tile in original image pixels
+export interface TilePlacement {
+  key: string;
+  x: number;
+  y: number;
+  factor: number; // original pixels per tile pixel
+}
+
+// Up to this many screen pixels per original image pixel when zooming in
+export const MAX_PIXEL_SCALE = 4;
+
+// The coarsest level that still has at least one pixel per screen pixel at `scale` (screen pixels per original pixel)
+export const tileLevel = (info: TileInfo, scale: number): number => {
+  return Math.max(0, Math.min(info.levels - 1, Math.floor(Math.log2(1 / scale))));
+}
+
+// Tiles covering the region [x0, x1) x [y0, y1) of the image, in original pixels
+export const visibleTiles = (
+  info: TileInfo, image_size: number[], scale: number, x0: number, y0: number, x1: number, y1: number,
+): TilePlacement[] => {
+  const level = tileLevel(info, scale);
+  const factor = 1 << level;
+  const span = info.tile_size * factor;
+
+  const col0 = Math.max(0, Math.floor(x0 / span));
+  const row0 = Math.max(0, Math.floor(y0 / span));
+  const col1 = Math.min(Math.ceil(image_size[0] / span), Math.ceil(x1 / span));
+  const row1 = Math.min(Math.ceil(image_size[1] / span), Math.ceil(y1 / span));
+
+  const tiles: TilePlacement[] = [];
+  for (let row = row0; row < row1; row++) {
+    for (let col = col0; col < col1; col++) {
+      tiles.push({ key: `${level}/${col}/${row}`, x: col * span, y: row * span, factor });
+    }
+  }
+  return tiles;
+}
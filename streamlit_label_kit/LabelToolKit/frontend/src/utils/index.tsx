@@ -3,4 +3,9 @@ export * from './BaseComponent';
 export * from './Rectangle';
 export * from './BaseItem';
 export * from './PythonArgs';
-export * from './Mask';
\ No newline at end of file
+export * from './Mask';
+export * from './MaskEncoding';
+export * from './MaskCompositor';
+export * from './Patch';
+export * from './Commit';
+export * from './Tiles';
@@ -0,0 +1,396 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+from __future__ import annotations
+import io
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from hashlib import md5
+from typing import BinaryIO, Callable, Hashable, Literal, NamedTuple, Optional, Sequence, Tuple, Union
+import numpy as np
+from PIL import Image
+from streamlit import runtime
+from streamlit.runtime import caching
+from . import thumbnail_with_upscale
+
+ImageFormat = Literal["auto", "png", "jpeg", "webp"]
+
+_PIL_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+
+
+class CachedImage(NamedTuple):
+    image: Image.Image              # resized image shown in the component
+    data: bytes                     # encoded bytes served to the frontend
+    format: str                     # format of `data`: "png", "jpeg" or "webp"
+    digest: str                     # identity used to name the media file
+    original_size: Tuple[int, int]  # (width, height) of the source image
+    nbytes: int                     # approximate memory held by this entry
+
+
+class ImageCache:
+    """
+    Bounded, thread-safe LRU cache for the decode -> resize -> encode pipeline.
+
+    Entries are keyed on the image identity (see `image_identity`) and the target size.
+
+    Entries are evicted least-recently-used first whenever either `max_entries`
+    or `max_bytes` is exceeded. A single entry larger than `max_bytes` is never
+    stored.
+
+    Args:
+    max_entries (int): Maximum number of cached images.
+    max_bytes (int): Maximum total size (resized pixels + encoded bytes) of cached images.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 256 * 1024 * 1024):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, CachedImage]" = OrderedDict()
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None) -> None:
+        """Change the cache limits, evicting entries if the new limits are exceeded."""
+        with self._lock:
+            if max_entries is not None:
+                self._max_entries = max_entries
+            if max_bytes is not None:
+                self._max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key: Hashable) -> Optional[CachedImage]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: CachedImage) -> None:
+        with self._lock:
+            if entry.nbytes > self._max_bytes or self._max_entries <= 0:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old.nbytes
+            self._entries[key] = entry
+            self._nbytes += entry.nbytes
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and the current cache occupancy."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+                "max_entries": self._max_entries,
+                "max_bytes": self._max_bytes,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self) -> None:
+        # Caller must hold self._lock
+        while self._entries and (
+            len(self._entries) > self._max_entries or self._nbytes > self._max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._nbytes -= entry.nbytes
+            self.evictions += 1
+
+
+# Process-wide cache shared by detection(), segmentation() and annotation()
+image_cache = ImageCache()
+
+
+def _stat_identity(image_path) -> str:
+    path = os.path.abspath(os.fspath(image_path))
+    stat = os.stat(path)
+    return md5(f"{path}:{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()
+
+
+def _content_identity(image_path, chunk_size: int = 1 << 20) -> str:
+    crc = 0
+    size = 0
+    with open(image_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    return f"{crc:08x}{size:x}"
+
+
+def _memory_identity(image) -> str:
+    # Images in memory have no file to stat, so they are identified by a CRC32 of their bytes or pixels
+    header = ""
+    if isinstance(image, Image.Image):
+        header, image = f"{image.mode}{image.size}", image.tobytes()
+    elif isinstance(image, np.ndarray):
+        header, image = f"{image.dtype}{image.shape}", np.ascontiguousarray(image)
+    elif isinstance(image, io.BytesIO):
+        image = image.getbuffer()
+
+    # Hashed in place; the view is released so that a BytesIO can be resized again
+    with memoryview(image) as data:
+        crc = zlib.crc32(data, zlib.crc32(header.encode()))
+        return f"mem-{crc:08x}{data.nbytes:x}"
+
+
+IDENTITY_STRATEGIES = {
+    "stat": _stat_identity,
+    "content": _content_identity,
+}
+
+# A path, or an image already in memory: decoded (PIL Image, HxW or HxWxC uint8 array) or encoded (bytes, file object)
+ImageSource = Union[str, os.PathLike, Image.Image, np.ndarray, bytes, bytearray, memoryview, BinaryIO]
+
+ImageIdentity = Union[Literal["stat", "content"], Callable[[ImageSource], str]]
+
+
+def _is_path(image) -> bool:
+    return isinstance(image, (str, os.PathLike))
+
+
+def image_identity(image, identity: ImageIdentity = "stat", image_id: Optional[str] = None) -> str:
+    """
+    Compute a cheap identity for an image without decoding it.
+
+    Args:
+    image (Union[str, PIL.Image.Image, np.ndarray, bytes, BinaryIO]): Path to the image file, or the image in memory.
+    identity (Union[Literal["stat", "content"], Callable], optional): Strategy used to identify the image.
+        "stat" uses path, inode, modification time and size; "content" uses a CRC32 of the encoded file bytes;
+        a callable receives `image` and returns the identity string. Images in memory are always identified
+        by a CRC32 of their bytes or pixels, unless a callable or `image_id` is given.
+    image_id (str, optional): Caller-supplied content id (e.g. a dataset hash). Takes precedence over `identity`.
+
+    Returns:
+    str: The identity of the image.
+    """
+    if image_id is not None:
+        return str(image_id)
+    if callable(identity):
+        return str(identity(image))
+    if identity not in IDENTITY_STRATEGIES:
+        raise ValueError(f"Unknown image identity strategy: {identity!r}")
+    if not _is_path(image):
+        return _memory_identity(image)
+    return IDENTITY_STRATEGIES[identity](image)
+
+
+def _read_stream(image):
+    # Other file objects than BytesIO may not be seekable; read them once for both identity and decoding
+    if not _is_path(image) and not isinstance(image, (Image.Image, np.ndarray, io.BytesIO)) and hasattr(image, "read"):
+        return image.read()
+    return image
+
+
+def _open_image(image):
+    if isinstance(image, Image.Image):
+        # Owned by the caller, so it must not be closed here
+        return nullcontext(image)
+    if isinstance(image, np.ndarray):
+        return nullcontext(Image.fromarray(image))
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(image))
+    return Image.open(image)
+
+
+def _resolve_format(image: Image.Image, image_format: ImageFormat) -> str:
+    if image_format != "auto":
+        if image_format not in _PIL_FORMATS:
+            raise ValueError(f"Unknown image format: {image_format!r}")
+        return image_format
+    # Masks, overlays, drawings and anything with transparency stay lossless; photos are sent as JPEG
+    if image.mode not in ("RGB", "L") or image.getcolors(256) is not None:
+        return "png"
+    return "jpeg"
+
+
+def _save_image(image: Image.Image, image_format: str, image_quality: int) -> bytes:
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image_format == "webp" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, format="PNG")
+    else:
+        image.save(buffer, format=_PIL_FORMATS[image_format], quality=image_quality)
+    return buffer.getvalue()
+
+
+# Like PIL's image.thumbnail, reduced decoding keeps at least this factor above the target size for the final resample
+DRAFT_GAP = 2.0
+
+
+def _encode_image(
+    image, image_width: int, image_height: int, digest: str, image_format: ImageFormat, image_quality: int
+) -> CachedImage:
+    opened_here = not isinstance(image, (Image.Image, np.ndarray))
+    with _open_image(image) as source:
+        original_size = source.size
+        if opened_here:
+            # JPEGs much larger than the target are decoded at 1/2, 1/4 or 1/8 scale by the DCT (no-op for other formats).
+            # Images passed in by the caller are left alone, as draft() changes how they are decoded.
+            ratio = min(image_width / original_size[0], image_height / original_size[1]) * DRAFT_GAP
+            source.draft(None, (max(1, int(original_size[0] * ratio)), max(1, int(original_size[1] * ratio))))
+        image = thumbnail_with_upscale(source, (image_width, image_height))
+
+    image_format = _resolve_format(image, image_format)
+    data = _save_image(image, image_format, image_quality)
+
+    nbytes = len(data) + image.size[0] * image.size[1] * len(image.getbands())
+    return CachedImage(image, data, image_format, digest, original_size, nbytes)
+
+
+def load_image(
+    image: ImageSource,
+    image_width: int,
+    image_height: int,
+    image_id: Optional[str] = None,
+    identity: ImageIdentity = "stat",
+    image_format: ImageFormat = "auto",
+    image_quality: int = 85,
+    cache: Optional[ImageCache] = None,
+) -> CachedImage:
+    """
+    Load, resize and encode an image, reusing a cached result when the image is unchanged.
+
+    Args:
+    image (Union[str, PIL.Image.Image, np.ndarray, bytes, BinaryIO]): Path to the image file, or the image in memory.
+    image_width (int): Width to which the image is resized.
+    image_height (int): Height to which the image is resized.
+    image_id (str, optional): Caller-supplied content id of the image, see `image_identity`.
+    identity (Union[Literal["stat", "content"], Callable], optional): Strategy used to identify the image, see `image_identity`.
+    image_format (Literal["auto", "png", "jpeg", "webp"], optional): Format the resized image is encoded in. "auto" uses
+        lossless PNG for images with transparency or at most 256 colors (masks, overlays, drawings) and JPEG otherwise.
+    image_quality (int, optional): JPEG/WebP quality (1-100), ignored for PNG.
+    cache (ImageCache, optional): Cache to use instead of the process-wide `image_cache`.
+
+    Returns:
+    CachedImage: The resized image, its encoded bytes and the original image size.
+    """
+    cache = image_cache if cache is None else cache
+    image = _read_stream(image)
+
+    digest = image_identity(image, identity, image_id)
+    key = (digest, image_width, image_height, image_format, image_quality)
+
+    entry = cache.get(key)
+    if entry is None:
+        entry = _encode_image(image, image_width, image_height, digest, image_format, image_quality)
+        cache.put(key, entry)
+    return entry
+
+
+def preload_images(
+    images: Sequence[ImageSource],
+    image_width: int,
+    image_height: int,
+    image_ids: Optional[Sequence[str]] = None,
+    identity: ImageIdentity = "stat",
+    image_format: ImageFormat = "auto",
+    image_quality: int = 85,
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+    cache: Optional[ImageCache] = None,
+) -> int:
+    """
+    Load, resize and encode many images in parallel, so that the components find them in the cache.
+
+    Pillow releases the GIL while decoding, resizing and encoding, so threads scale well. With
+    `use_processes`, images are prepared in worker processes and sent back to be cached here; this
+    requires picklable images (paths are best) and a `__main__` guard where processes are spawned.
+
+    Args:
+    images (Sequence[Union[str, PIL.Image.Image, np.ndarray, bytes]]): Paths to the image files, or images in memory.
+    image_width (int): Width to which images are resized, as passed to the components.
+    image_height (int): Height to which images are resized, as passed to the components.
+    image_ids (Sequence[str], optional): Caller-supplied content id of each image, see `image_identity`.
+    identity (Union[Literal["stat", "content"], Callable], optional): Strategy used to identify images, see `image_identity`.
+    image_format (Literal["auto", "png", "jpeg", "webp"], optional): Format images are encoded in, see `load_image`.
+    image_quality (int, optional): JPEG/WebP quality (1-100), ignored for PNG.
+    max_workers (int, optional): Number of threads or processes; defaults to the executor's default.
+    use_processes (bool, optional): Use a process pool instead of a thread pool.
+    cache (ImageCache, optional): Cache to fill instead of the process-wide `image_cache`.
+
+    Returns:
+    int: The number of images that were not cached yet.
+    """
+    cache = image_cache if cache is None else cache
+    if image_ids is not None and len(image_ids) != len(images):
+        raise ValueError(f"Got {len(image_ids)} image ids for {len(images)} images")
+
+    missing = {}
+    for i, image in enumerate(images):
+        image = _read_stream(image)
+        digest = image_identity(image, identity, image_ids[i] if image_ids is not None else None)
+        key = (digest, image_width, image_height, image_format, image_quality)
+        if key not in missing and cache.get(key) is None:
+            missing[key] = image
+
+    if not missing:
+        return 0
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_encode_image, image, image_width, image_height, key[0], image_format, image_quality): key
+            for key, image in missing.items()
+        }
+        for future in as_completed(futures):
+            cache.put(futures[future], future.result())
+    return len(missing)
+
+
+def register_media(data: bytes, mimetype: str, file_id: str) -> str:
+    """
+    Register encoded bytes with Streamlit's media file manager and return their URL.
+
+    Media files are tracked per session and dropped when a run does not register
+    them again, so whatever the frontend displays has to be registered on every run.
+    """
+    if not runtime.exists():
+        # Bare mode, e.g. running the script with plain python
+        return ""
+
+    url = runtime.get_instance().media_file_mgr.add(data, mimetype, file_id)
+    caching.save_media_data(data, mimetype, file_id)
+    if url.startswith("/"):
+        url = url[1:]
+    return url
+
+
+def get_image_url(entry: CachedImage, prefix: str, key=None) -> str:
+    """
+    Register an encoded image with Streamlit's media file manager and return its URL.
+
+    The already encoded bytes are handed over on every run; no decoding or
+    re-encoding takes place. The bytes are registered directly rather than
+    through `image_to_url`, which only serves PNG, JPEG and GIF and would
+    re-encode anything else.
+    """
+    return register_media(entry.data, f"image/{entry.format}", f"{prefix}-{entry.digest}-{key}")
@@ -0,0 +1,363 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+from __future__ import annotations
+import base64
+import json
+from hashlib import md5
+from typing import Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple, Union
+import numpy as np
+
+MaskEncoding = Literal["json", "rle", "packbits"]
+
+
+def mask_to_rle(mask, compressed: bool = False) -> Dict[str, Union[List[int], str]]:
+    """
+    Encode a binary mask as COCO run-length encoding.
+
+    Runs are counted in column-major (Fortran) order and start with a run of zeros, as in pycocotools.
+
+    Args:
+    mask (np.ndarray or List[List[bool]]): HxW binary mask.
+    compressed (bool, optional): If True, `counts` is the compact string form used in COCO json files.
+
+    Returns:
+    Dict: {"size": [height, width], "counts": [int] or str}
+    """
+    mask = np.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    flat = mask.ravel(order="F")
+
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], changes, [flat.size])))
+    if flat.size and flat[0]:
+        counts = np.concatenate(([0], counts))
+
+    counts = counts.tolist()
+    return {"size": [height, width], "counts": _counts_to_string(counts) if compressed else counts}
+
+
+def rle_to_mask(rle: Dict[str, Union[List[int], str]]) -> np.ndarray:
+    """
+    Decode COCO run-length encoding into a binary mask.
+
+    Args:
+    rle (Dict): {"size": [height, width], "counts": [int] or str}
+
+    Returns:
+    np.ndarray: HxW boolean mask.
+    """
+    height, width = rle["size"]
+    counts = rle["counts"]
+    if isinstance(counts, (str, bytes)):
+        counts = _string_to_counts(counts)
+
+    counts = np.asarray(counts, dtype=np.int64)
+    values = (np.arange(len(counts)) % 2).astype(bool)
+    flat = np.repeat(values, counts)
+    if flat.size != height * width:
+        raise ValueError(f"RLE counts sum to {flat.size}, expected {height * width} for size {rle['size']}")
+    return flat.reshape((height, width), order="F")
+
+
+def mask_to_packbits(mask) -> Dict[str, Union[List[int], str]]:
+    """
+    Encode a binary mask as base64 of its bit-packed pixels (1 bit per pixel).
+
+    Pixels are packed in row-major order, most significant bit first, as by `np.packbits`.
+
+    Args:
+    mask (np.ndarray or List[List[bool]]): HxW binary mask.
+
+    Returns:
+    Dict: {"size": [height, width], "bits": str}
+    """
+    mask = np.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    return {"size": [height, width], "bits": base64.b64encode(np.packbits(mask, axis=None).tobytes()).decode("ascii")}
+
+
+def packbits_to_mask(packed: Dict[str, Union[List[int], str]]) -> np.ndarray:
+    """
+    Decode a bit-packed mask produced by `mask_to_packbits`.
+
+    Args:
+    packed (Dict): {"size": [height, width], "bits": str}
+
+    Returns:
+    np.ndarray: HxW boolean mask.
+    """
+    height, width = packed["size"]
+    bits = np.frombuffer(base64.b64decode(packed["bits"]), dtype=np.uint8)
+    return np.unpackbits(bits, count=height * width).reshape(height, width).view(bool)
+
+
+def decode_mask(data) -> np.ndarray:
+    """
+    Decode a mask in any supported transport format (nested lists, RLE or packbits) into a boolean array.
+    """
+    if isinstance(data, dict):
+        if "bits" in data:
+            return packbits_to_mask(data)
+        return rle_to_mask(data)
+    return np.asarray(data, dtype=bool)
+
+
+def encode_mask(mask, encoding: MaskEncoding = "json"):
+    """
+    Encode a mask for transport to the frontend.
+
+    Args:
+    mask (np.ndarray, List[List[bool]] or Dict): The mask, or an already encoded RLE/packbits dict.
+    encoding (Literal["json", "rle", "packbits"], optional): Target transport format.
+
+    Returns:
+    The mask as nested lists of booleans ("json"), an RLE dict ("rle") or a packbits dict ("packbits").
+    """
+    if encoding == "json":
+        if isinstance(mask, list):
+            return mask
+        return decode_mask(mask).tolist()
+    if encoding == "rle":
+        if isinstance(mask, dict) and "counts" in mask and not isinstance(mask["counts"], (str, bytes)):
+            return mask
+        return mask_to_rle(decode_mask(mask))
+    if encoding == "packbits":
+        if isinstance(mask, dict) and "bits" in mask:
+            return mask
+        return mask_to_packbits(decode_mask(mask))
+    raise ValueError(f"Unknown mask encoding: {encoding!r}")
+
+
+def encode_masks(masks, encoding: MaskEncoding = "json") -> list:
+    """
+    Encode a stack of masks for transport to the frontend.
+
+    Args:
+    masks (np.ndarray or List): NxHxW (or a single HxW) bool/uint8 array, or a list of masks accepted by `encode_mask`.
+    encoding (Literal["json", "rle", "packbits"], optional): Target transport format.
+
+    Returns:
+    List: One encoded mask per input mask.
+    """
+    if masks is None:
+        return []
+    if isinstance(masks, np.ndarray):
+        if masks.ndim == 2:
+            masks = masks[np.newaxis]
+        if encoding == "json":
+            # One vectorized conversion for the whole stack
+            return masks.astype(bool, copy=False).tolist()
+    return [encode_mask(mask, encoding) for mask in masks]
+
+
+def decode_masks(masks: list, height: int, width: int) -> np.ndarray:
+    """
+    Decode transported masks into a single contiguous NxHxW boolean array.
+
+    Args:
+    masks (List): Masks in any format accepted by `decode_mask`.
+    height (int): Height of each mask.
+    width (int): Width of each mask.
+
+    Returns:
+    np.ndarray: NxHxW boolean array.
+    """
+    if len(masks) and all(isinstance(mask, list) for mask in masks):
+        return np.array(masks, dtype=bool).reshape(len(masks), height, width)
+
+    out = np.empty((len(masks), height, width), dtype=bool)
+    for i, mask in enumerate(masks):
+        out[i] = decode_mask(mask)
+    return out
+
+
+def resize_mask(mask, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Resize a binary mask with nearest-neighbour sampling of pixel centres.
+
+    Args:
+    mask (np.ndarray or List[List[bool]]): HxW binary mask.
+    size (Tuple[int, int]): The target size (width, height).
+
+    Returns:
+    np.ndarray: The resized boolean mask.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    width, height = size
+    src_height, src_width = mask.shape
+    if (src_width, src_height) == (width, height):
+        return mask
+
+    rows = ((np.arange(height) + 0.5) * (src_height / height)).astype(np.intp)
+    cols = ((np.arange(width) + 0.5) * (src_width / width)).astype(np.intp)
+    return mask.take(rows, axis=0).take(cols, axis=1)
+
+
+def resolve_overlaps(masks, priority: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    Make a stack of masks disjoint, so that every pixel belongs to at most one mask.
+
+    Each pixel is kept by the covering mask with the highest priority; ties go to the later mask.
+    Without `priority`, later masks win, matching the order in which the component draws them.
+
+    Args:
+    masks (np.ndarray or List): NxHxW (or a single HxW) bool/uint8 array, or a list of masks accepted by `decode_mask`.
+    priority (Sequence[float], optional): One priority per mask.
+
+    Returns:
+    np.ndarray: NxHxW boolean array of disjoint masks.
+    """
+    if isinstance(masks, np.ndarray):
+        masks = masks.astype(bool, copy=False)
+        if masks.ndim == 2:
+            masks = masks[np.newaxis]
+    else:
+        masks = np.stack([decode_mask(mask) for mask in masks]) if len(masks) else np.zeros((0, 0, 0), dtype=bool)
+
+    count = len(masks)
+    order = np.arange(count)
+    if priority is not None:
+        if len(priority) != count:
+            raise ValueError(f"Got {len(priority)} priorities for {count} masks")
+        order = np.argsort(np.asarray(priority), kind="stable")
+
+    # Owner of each pixel, painted in increasing priority; -1 where no mask is set
+    owner = np.full(masks.shape[1:], -1, dtype=np.int32)
+    for i in order:
+        owner[masks[i]] = i
+    return owner[np.newaxis] == np.arange(count)[:, np.newaxis, np.newaxis]
+
+
+def mask_key(mask) -> str:
+    """
+    Return a digest of the content of a mask, in any format accepted by `decode_mask`.
+
+    Arrays and nested lists are hashed as bits, which is cheap even at full image resolution; RLE and
+    packbits dicts by their payload.
+    """
+    h = md5()
+    if isinstance(mask, dict):
+        h.update(json.dumps(mask, sort_keys=True, default=lambda value: np.asarray(value).tolist()).encode())
+    else:
+        mask = np.asarray(mask, dtype=bool)
+        h.update(f"{mask.shape}".encode())
+        h.update(np.packbits(mask).tobytes())
+    return h.hexdigest()
+
+
+class _ResampledMask(NamedTuple):
+    key: str                # digest of the mask as given by the caller
+    original: Optional[np.ndarray]  # decoded mask at original resolution, None if not resampled
+    display_size: Optional[Tuple[int, int]]
+    encoding: str
+    display: object         # encoded mask at display resolution, as sent to the frontend
+
+
+class MaskResampler:
+    """
+    Maps masks between original image resolution and display resolution, caching the result per mask id.
+
+    A mask is only resampled again when its content, the display size or the encoding changes. Without a
+    display size, masks are only encoded, which makes their encoding cost scale with the edits.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _ResampledMask] = {}
+
+    def to_display(
+        self,
+        mask_ids: Sequence[str],
+        masks: Sequence,
+        display_size: Optional[Tuple[int, int]],
+        encoding: MaskEncoding = "json",
+        keys: Optional[Sequence[str]] = None,
+    ) -> list:
+        """
+        Downsample masks given at original resolution and encode them for the frontend.
+
+        With `display_size` None, masks are encoded at their own size. `keys` are the `mask_key` of each
+        mask, if the caller already computed them.
+        """
+        if display_size is not None:
+            display_size = tuple(display_size)
+        if isinstance(masks, np.ndarray) and masks.ndim == 2:
+            masks = masks[np.newaxis]
+        if keys is None:
+            keys = [mask_key(mask) for mask in masks]
+
+        entries = {}
+        displays = []
+        for mask_id, mask, key in zip(mask_ids, masks, keys):
+            entry = self._entries.get(mask_id)
+            # Keyed on content: the masks of an NxHxW stack are new views on every call
+            if (
+                entry is None
+                or entry.display_size != display_size
+                or entry.encoding != encoding
+                or entry.key != key
+            ):
+                if display_size is None:
+                    entry = _ResampledMask(key, None, None, encoding, encode_mask(mask, encoding))
+                else:
+                    original = decode_mask(mask)
+                    display = encode_mask(resize_mask(original, display_size), encoding)
+                    entry = _ResampledMask(key, original, display_size, encoding, display)
+            entries[mask_id] = entry
+            displays.append(entry.display)
+
+        # Forget masks that are no longer shown
+        self._entries = entries
+        return displays
+
+    def to_original(self, mask_id: str, data, original_size: Tuple[int, int]) -> np.ndarray:
+        """Upsample a mask returned by the frontend, reusing the original mask if it was not edited."""
+        entry = self._entries.get(mask_id)
+        if entry is not None and entry.original is not None and data == entry.display:
+            return entry.original
+        return resize_mask(decode_mask(data), original_size)
+
+
+def _counts_to_string(counts: List[int]) -> str:
+    # Port of pycocotools rleToString
+    chars = []
+    for i, x in enumerate(counts):
+        if i > 2:
+            x -= counts[i - 2]
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return "".join(chars)
+
+
+def _string_to_counts(s: Union[str, bytes]) -> List[int]:
+    # Port of pycocotools rleFrString
+    if isinstance(s, bytes):
+        s = s.decode("ascii")
+    counts = []
+    p = 0
+    while p < len(s):
+        x = 0
+        k = 0
+        more = True
+        while more:
+            c = ord(s[p]) - 48
+            x |= (c & 0x1F) << (5 * k)
+            more = c & 0x20
+            p += 1
+            k += 1
+            if not more and c & 0x10:
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
@@ -0,0 +1,89 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+from __future__ import annotations
+import json
+from hashlib import md5
+from typing import Callable, Dict, List, Literal, Optional
+import numpy as np
+
+TransferMode = Literal["full", "patch"]
+
+
+def input_digest(*values) -> str:
+    """
+    Compute a digest of the items passed to a component, used as the base the frontend's patches refer to.
+
+    Arrays are hashed by their raw bytes; anything else by its JSON form.
+    """
+    h = md5()
+    for value in values:
+        _update_digest(h, value)
+    return h.hexdigest()
+
+
+def _update_digest(h, value) -> None:
+    if isinstance(value, np.ndarray):
+        h.update(f"{value.dtype}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)) and any(isinstance(v, np.ndarray) for v in value):
+        h.update(b"[")
+        for v in value:
+            _update_digest(h, v)
+        h.update(b"]")
+    else:
+        h.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+
+class PatchState:
+    """
+    Session-cached copy of a component's items, kept in sync with the frontend through patches.
+
+    In "patch" transfer mode the frontend only sends the items added, modified or deleted since its
+    previous value, tagged with the base (digest of the inputs it diffed against) and a monotonically
+    increasing revision. A component value is returned again on every rerun, so a patch is applied
+    only once, and patches against other inputs are ignored.
+    """
+
+    def __init__(self):
+        self.base: Optional[str] = None
+        self.revision = 0
+        self.items: Dict[str, dict] = {}
+
+    def reset(self, base: str, items: Dict[str, dict]) -> None:
+        """Start over from the items sent to the frontend under `base`."""
+        self.base = base
+        self.revision = 0
+        self.items = items
+
+    def apply(self, patch: dict, convert: Callable[[dict], dict]) -> bool:
+        """
+        Apply a patch sent by the frontend.
+
+        Args:
+        patch (dict): {"base": str, "revision": int, "upserted": [item], "deleted": [id], "order": [id] or None}
+        convert (Callable): Converts an item as sent by the frontend into the returned item format.
+
+        Returns:
+        bool: False if the patch was already applied or refers to other inputs.
+        """
+        if patch["base"] != self.base or patch["revision"] <= self.revision:
+            return False
+
+        for item_id in patch["deleted"]:
+            self.items.pop(item_id, None)
+        for item in patch["upserted"]:
+            self.items[item["id"]] = convert(item)
+        if patch.get("order") is not None:
+            self.items = {item_id: self.items[item_id] for item_id in patch["order"] if item_id in self.items}
+
+        self.revision = patch["revision"]
+        return True
+
+    def values(self) -> List[dict]:
+        # Shallow copies, so that callers modifying the result do not modify the cached state
+        return [dict(item) for item in self.items.values()]
@@ -6,23 +6,17 @@
 #
 
 from __future__ import annotations
-from hashlib import md5
 from typing import Literal, Union, List, Dict
-import matplotlib.pyplot as plt
 import numpy as np
-import streamlit.elements.image as st_image
-from PIL import Image
+import streamlit as st
 from streamlit.components.v1.components import CustomComponent
-from . import _component_func, convert_bbox_format, relative_to_absolute, absolute_to_relative, thumbnail_with_upscale
-
-
-def _get_colormap(label_names, colormap_name="gist_rainbow"):
-    colormap = {}
-    cmap = plt.get_cmap(colormap_name)
-    for idx, l in enumerate(label_names):
-        rgb = [int(d) for d in np.array(cmap(float(idx) / len(label_names))) * 255][:3]
-        colormap[l] = "#%02x%02x%02x" % tuple(rgb)
-    return colormap
+from . import _component_func, convert_bboxes
+from .colormap import get_colormap
+from .image_cache import ImageIdentity, load_image, get_image_url
+from .mask import MaskEncoding, MaskResampler, encode_masks, decode_masks, decode_mask, mask_key, resize_mask
+from .patch import PatchState, TransferMode, input_digest
+from .store import AnnotationStore, _mask_record_masks, _record_labels, _store_value, record_id
+from .sync import join_sync_group
 
 
 SELECT_HEIGHT = 60
@@ -50,9 +44,32 @@ def _calc_size(size):
     return ui_height, ui_width
 
 
+def _segmentation_record(items: list, mask_size, image_size, compress: bool = False) -> dict:
+    masks = [item["masks"] for item in items]
+    return {
+        "masks": _mask_record_masks(masks) if compress else masks,
+        "mask_size": mask_size,
+        "mask_ids": [item["mask_ids"] for item in items],
+        "labels": [item["labels"] for item in items],
+        "label_names": [item["label_names"] for item in items],
+        "meta_data": [item["meta_data"] for item in items],
+        "info_dict": [item["info_dict"] for item in items],
+        "image_size": image_size,
+    }
+
+
+def _record_inputs(record: dict, mask_size, label_list: list) -> tuple:
+    # masks, labels, mask_ids, meta_data and info_dict of a record, as given to segmentation()
+    masks = record["masks"]
+    if tuple(record["mask_size"]) != tuple(mask_size):
+        masks = [resize_mask(decode_mask(mask), mask_size) for mask in masks]
+    labels = _record_labels(record, label_list)
+    return list(masks), labels, list(record["mask_ids"]), list(record["meta_data"]), list(record["info_dict"])
+
+
 def segmentation(
-    image_path,
-    label_list,
+    image_path=None,
+    label_list=[],
     masks=None,
     mask_ids=[],
     labels=[],
@@ -77,15 +94,29 @@ def segmentation(
     ui_right_size: Union[Literal["small", "medium", "large"], int] = None,
     auto_segmentation: bool = False,
     component_alignment: Literal["left", "center", "right"] = "left",
+    colormap: str = "gist_rainbow",
+    mask_encoding: MaskEncoding = "json",
+    return_format: Literal["list", "numpy"] = "list",
+    mask_resolution: Literal["display", "original"] = "display",
+    transfer_mode: TransferMode = "full",
+    commit_mode: Literal["immediate", "debounce", "explicit"] = "immediate",
+    commit_delay: int = 500,
+    image=None,
+    image_id: str = None,
+    image_identity: ImageIdentity = "stat",
+    image_format: Literal["auto", "png", "jpeg", "webp"] = "auto",
+    image_quality: int = 85,
+    store: AnnotationStore = None,
+    sync_group: str = None,
     key=None,
 ) -> CustomComponent:
     """
     Process an image for segmentation, providing a UI for interaction, and enabling editing and mask generation.
 
     Args:
-        image_path (str): File path of the image to be segmented.
+        image_path (str, optional): File path of the image to be segmented. Not needed if `image` is given.
         label_list (List[str]): Labels used for classifying segmentation masks.
-        masks (List[np.ndarray], optional): Initial list of mask arrays corresponding to each label.
+        masks (Union[np.ndarray, List[np.ndarray]], optional): Initial masks, as an NxHxW (or HxW) bool/uint8 array or a list of masks.
         mask_ids (List[str], optional): Unique identifiers for each mask.
         labels (List[int], optional): Indices from `label_list` corresponding to each mask.
         read_only (bool, optional): If True, disable any modifications to masks and metadata.
@@ -109,6 +140,20 @@ def segmentation(
         ui_right_size (Union[Literal["small", "medium", "large"], int], optional): Custom size for right-positioned UI elements.
         auto_segmentation (bool, optional): For "new" segmentation, user provides bounding boxes, instead of full masks.
         component_alignment (Literal["left", "center", "right"], optional): Alignment of the UI components within the interface.
+        colormap (str, optional): Colormap used to color labels; "gist_rainbow", "hsv", "jet", "tab10" and "tab20" are built in, other names require matplotlib.
+        mask_encoding (Literal["json", "rle", "packbits"], optional): How masks travel between Python and the frontend. "json" sends nested lists of booleans; "rle" sends COCO run-length encoding and "packbits" sends base64 of `np.packbits` (1 bit per pixel). Returned masks use the same encoding, see `decode_mask`. `masks` may be given as arrays, nested lists, RLE or packbits dicts.
+        return_format (Literal["list", "numpy"], optional): With "numpy", all returned masks are decoded once into a contiguous NxHxW boolean array under "mask_array", and each "masks" entry is a view into it.
+        mask_resolution (Literal["display", "original"], optional): With "original", `masks` are given at the original image resolution and returned as boolean arrays at that resolution; nearest-neighbour resampling to the display size is done once per mask and cached per mask id.
+        transfer_mode (Literal["full", "patch"], optional): With "patch", the frontend only sends the masks added, modified or deleted by each edit, which are applied to a copy of the masks cached in the session state. Masks are only encoded again when they change.
+        commit_mode (Literal["immediate", "debounce", "explicit"], optional): When edits are sent back to Python (each causing a rerun): "immediate" sends every edit; "debounce" sends the latest state once no edit was made for `commit_delay` ms; "explicit" only sends it on the Save button or Ctrl/Cmd+S. Until then, the frontend keeps its local state.
+        commit_delay (int, optional): Idle time in milliseconds before edits are sent with commit_mode="debounce".
+        image (Union[PIL.Image.Image, np.ndarray, bytes, BinaryIO], optional): The image in memory instead of a file: a PIL Image, an HxW or HxWxC uint8 array, or encoded image bytes or a file object. Takes precedence over `image_path`; identified by a CRC32 of its bytes or pixels unless `image_id` is given.
+        image_id (str, optional): Caller-supplied content id of the image (e.g. a dataset hash), used to cache and name the served image.
+        image_identity (Union[Literal["stat", "content"], Callable], optional): How the image is identified when `image_id` is not given: "stat" (path, inode, mtime, size), "content" (CRC32 of the file bytes) or a callable returning an id for the image (path or image in memory).
+        image_format (Literal["auto", "png", "jpeg", "webp"], optional): Format the displayed image is sent in. "auto" keeps images with transparency or at most 256 colors (masks, overlays, drawings) lossless as PNG and sends photos as JPEG.
+        image_quality (int, optional): JPEG/WebP quality (1-100) of the displayed image, ignored for PNG.
+        store (AnnotationStore, optional): Persistent store the initial annotations are read from when `masks` is None, and every new returned value is written to. Records are stored under `image_id`, else the image path, else the identity of the image in memory.
+        sync_group (str, optional): Name of a group of linked segmentation components in the session (e.g. two views of one image). An edit in any of them is shown by all in the same rerun, and all return the shared state with its `revision`. Until the first edit, or when their inputs change, each shows its inputs. Requires `key`.
         key (any, optional): A unique key to identify the Streamlit component instance.
 
     Returns:
@@ -119,7 +164,7 @@ def segmentation(
             {
                 "mask": [
                     {
-                        "masks": [[bool]],  # 2D boolean array representing the mask
+                        "masks": [[bool]],  # 2D boolean array representing the mask (an RLE or packbits dict with mask_encoding="rle"/"packbits")
                         "mask_ids": str,    # Unique identifier for the mask
                         "labels": int,      # Index of the label from `label_list`
                         "label_names": str, # Name of the label
@@ -127,9 +172,11 @@ def segmentation(
                         "info_dict": {str: str}, # Dictionary of additional string-string pairs
                     }
                 ],
-                "mask_size": (int, int),  # Size of the resized image masks
+                "mask_size": (int, int),  # Size of the returned masks (the resized image, or the original image with mask_resolution="original")
                 "image_size": (int, int), # Original dimensions of the input image
                 "key": str                # Unique identifier for the returned value
+                "mask_array": np.ndarray  # NxHxW boolean array of all masks (only with return_format="numpy")
+                "revision": int           # With sync_group: number of edits to the shared state
             }
         
         - For auto_segmentation mode when a new bounding box is provided:
@@ -145,7 +192,7 @@ def segmentation(
                     "bbox_format": str      # Format of the bounding box data
                 },
                 "mask": [List of mask objects],
-                "mask_size": (int, int),  # Size of the resized image masks
+                "mask_size": (int, int),  # Size of the returned masks
                 "image_size": (int, int), # Original dimensions of the input image
                 "key": str                # Unique identifier for the returned value
             }
@@ -153,22 +200,18 @@ def segmentation(
 
 
     # Load Image and convert size
-    image = Image.open(image_path)
-    original_image_size = image.size
-    image = thumbnail_with_upscale(image, (image_width, image_height))
-
-    image_url = st_image.image_to_url(
-        image,
-        image.size[0],
-        True,
-        "RGB",
-        "PNG",
-        f"segmentation-{md5(image.tobytes()).hexdigest()}-{key}",
-    )
-    if image_url.startswith("/"):
-        image_url = image_url[1:]
+    if image is None and image_path is None:
+        raise ValueError("Either image_path or image must be given")
+    source = image if image is not None else image_path
+    cached = load_image(source, image_width, image_height, image_id, image_identity, image_format, image_quality)
+    image = cached.image
+    original_image_size = cached.original_size
+    store_id = record_id(source, image_id, cached.digest)
+
+    image_url = get_image_url(cached, "segmentation", key)
+    component_key = key
 
-    color_map = _get_colormap(label_list, colormap_name="gist_rainbow")
+    color_map = get_colormap(label_list, colormap_name=colormap)
 
     resized_image_size = image.size
     scale = original_image_size[0] / resized_image_size[0]
@@ -184,6 +227,69 @@ def segmentation(
     _bottom_size, _ = _calc_size(ui_bottom_size or ui_size)
     _, _right_size = _calc_size(ui_right_size or ui_size)
 
+    # Masks are given and returned at original resolution, or at the resolution of the displayed image.
+    # They are resampled, and in patch mode encoded, only when they change
+    mask_size = original_image_size if mask_resolution == "original" else resized_image_size
+    use_resampler = mask_resolution == "original" or transfer_mode == "patch"
+    if use_resampler:
+        resampler = st.session_state.setdefault(f"_label_kit_mask_resampler-{component_key}", MaskResampler())
+
+    def _convert_mask(item):
+        return {
+            "masks": (
+                resampler.to_original(item["id"], item["data"], original_image_size)
+                if mask_resolution == "original" else item["data"]
+            ),
+            "mask_ids" : item["id"],
+            "labels": item["label_id"],
+            "label_names": item["label"],
+            "meta_data": item["meta"],
+            "info_dict": item["additional_data"],
+        }
+    
+    def _decode(component_value):
+        # Returned masks of a component value; also called for other members of a sync group
+        if transfer_mode == "patch":
+            patch_state = st.session_state.setdefault(f"_label_kit_patch-{component_key}", PatchState())
+            if "patch" in component_value:
+                patch_state.apply(component_value["patch"], _convert_mask)
+            return patch_state.values()
+        if "mask" in component_value:
+            return [_convert_mask(item) for item in component_value["mask"]]
+        return []
+
+    # Resume from the store when no annotations are given
+    if store is not None and masks is None:
+        record = store.get(store_id, "segmentation")
+        if record is not None:
+            masks, labels, mask_ids, meta_data, info_dict = _record_inputs(record, mask_size, label_list)
+
+    if masks is None:
+        masks = []
+    elif isinstance(masks, np.ndarray) and masks.ndim == 2:
+        masks = masks[np.newaxis]
+
+    def _mask_keys(masks):
+        # Stand-ins for the masks in the digests of the inputs, much cheaper to hash than their pixels:
+        # the masks as sent when that form is compact (RLE, packbits), else a digest of their bits
+        if not use_resampler and mask_encoding != "json":
+            return encode_masks(masks, mask_encoding)
+        return [mask_key(mask) for mask in masks]
+
+    # Linked components show the latest edit made in any of them
+    group = None
+    mask_keys = None
+    if sync_group is not None:
+        mask_keys = _mask_keys(masks)
+        group = join_sync_group(
+            sync_group, "segmentation", component_key,
+            input_digest(cached.digest, mask_keys, labels, mask_ids, meta_data, info_dict, mask_encoding, mask_resolution),
+            lambda value: _segmentation_record(_decode(value), mask_size, original_image_size),
+        )
+        if group.record is not None:
+            masks, labels, mask_ids, meta_data, info_dict = _record_inputs(group.record, mask_size, label_list)
+            mask_keys = None
+
     # Configure default labels, meta_data
     num_masks = len(masks)
     if len(labels) > num_masks:
@@ -205,11 +311,23 @@ def segmentation(
         mask_ids = mask_ids[:num_masks]
     else:
         mask_ids.extend(["mask-" + str(i + len(mask_ids)) for i in range(num_masks - len(mask_ids))])
+
+    input_masks = masks
+    if mask_keys is None and use_resampler:
+        mask_keys = _mask_keys(masks)
+
+    if use_resampler:
+        display_size = resized_image_size if mask_resolution == "original" else None
+        masks = resampler.to_display(mask_ids, masks, display_size, mask_encoding, mask_keys)
+    elif mask_keys is not None and mask_encoding != "json":
+        masks = mask_keys  # already encoded
+    else:
+        masks = encode_masks(masks, mask_encoding)
     
     mask_info = [
         {
             "data": item[0],
-            "label": label_list[item[1]],
+            "label": label_list[int(item[1])],
             "meta": item[2],
             "additional_data": item[3],
             "id": item[4],
@@ -217,6 +335,29 @@ def segmentation(
         for item in zip(masks, labels, meta_data, info_dict, mask_ids)
     ]
     
+    # Cache the masks as returned, so that patches from the frontend can be applied to them
+    patch_base = None
+    if transfer_mode == "patch":
+        patch_state = st.session_state.setdefault(f"_label_kit_patch-{key}", PatchState())
+        patch_base = input_digest(
+            mask_keys, labels, meta_data, info_dict, mask_ids, mask_encoding, mask_resolution, resized_image_size
+        )
+        if patch_state.base != patch_base:
+            patch_state.reset(patch_base, {
+                item[4]: {
+                    "masks": (
+                        resampler.to_original(item[4], item[0], original_image_size)
+                        if mask_resolution == "original" else item[0]
+                    ),
+                    "mask_ids": item[4],
+                    "labels": int(item[1]),
+                    "label_names": label_list[int(item[1])],
+                    "meta_data": item[2],
+                    "info_dict": item[3],
+                }
+                for item in zip(masks, labels, meta_data, info_dict, mask_ids)
+            })
+
     _justify_content = {"left": "start", "center":"center", "right":"end"}[component_alignment]
 
 
@@ -243,68 +384,71 @@ def segmentation(
         read_only=read_only,
         label_type="segmentation",
         auto_seg_mode=auto_segmentation,
+        mask_encoding=mask_encoding,
         justify_content=_justify_content,
+        transfer_mode=transfer_mode,
+        patch_base=patch_base,
+        commit_mode=commit_mode,
+        commit_delay=commit_delay,
     )
-    
+
     _bboxes = []
     _masks = []
     key = 0
     if component_value is not None:    
-        bboxes = component_value["new"]
+        bboxes = component_value.get("new", [])
         key = int(component_value["key"])
-        masks = component_value["mask"]
                 
+        # Convert back to original scale and format
+        converted = np.array([item["bbox"] for item in bboxes], dtype=float).reshape(-1, 4) * scale
+        converted = convert_bboxes(converted, "XYWH", bbox_format, original_image_size[0], original_image_size[1])
         _bboxes = [
             {
-                "bboxes": [b * scale for b in item["bbox"]],
+                "bboxes": bbox,
                 "labels": item["label_id"],
                 "label_names": item["label"],
             }
-            for item in bboxes
+            for bbox, item in zip(converted.tolist(), bboxes)
         ]
         
-        # Convert back to original format
-        if "REL" in bbox_format:
-            bboxes = [
-                convert_bbox_format(bbox["bboxes"], "XYWH", bbox_format.replace("REL_", ""))
-                for bbox in _bboxes
-            ]
-            bboxes = [
-                absolute_to_relative(bbox, original_image_size[0], original_image_size[1])
-                for bbox in bboxes
-            ]
-        else:
-            bboxes = [
-                convert_bbox_format(bbox["bboxes"], "XYWH", bbox_format)
-                for bbox in _bboxes
-            ]
-        for i in range(len(_bboxes)):
-            _bboxes[i]["bboxes"] = bboxes[i]
-        
+        _masks = _decode(component_value)
+
+    if group is not None:
+        # Linked components return the state they show
+        key = group.key
         _masks = [
             {
-                "masks": item["data"],
-                "mask_ids" : item["id"],
-                "labels": item["label_id"],
-                "label_names": item["label"],
-                "meta_data": item["meta"],
-                "info_dict": item["additional_data"],
+                "masks": decode_mask(item[0]) if mask_resolution == "original" else item[5],
+                "mask_ids": item[4],
+                "labels": int(item[1]),
+                "label_names": label_list[int(item[1])],
+                "meta_data": item[2],
+                "info_dict": item[3],
             }
-            for item in masks
+            for item in zip(input_masks, labels, meta_data, info_dict, mask_ids, masks)
         ]
-    
+
+    result = {
+        "mask": _masks,
+        "mask_size": mask_size,
+        "image_size": original_image_size,
+        "key": key,
+    }
+
+    if store is not None:
+        _store_value(
+            store, "segmentation", store_id, key,
+            lambda: _segmentation_record(_masks, mask_size, original_image_size, compress=True), component_key,
+        )
+
+    if return_format == "numpy":
+        mask_array = decode_masks([item["masks"] for item in _masks], mask_size[1], mask_size[0])
+        for item, mask in zip(_masks, mask_array):
+            item["masks"] = mask
+        result["mask_array"] = mask_array
+
+    if group is not None:
+        result["revision"] = group.revision
     if len(_bboxes) > 0:
-        return {
-            "new": {"bbox": _bboxes, "bbox_format": bbox_format},
-            "mask": _masks,
-            "mask_size": resized_image_size,
-            "image_size": original_image_size,
-            "key": key,
-        }
-    else:
-        return {
-                "mask": _masks,
-                "mask_size": resized_image_size,
-                "image_size": original_image_size,
-                "key": key,
-            }
+        result = {"new": {"bbox": _bboxes, "bbox_format": bbox_format}, **result}
+    return result
@@ -0,0 +1,217 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterator, Literal, Optional, Tuple
+import numpy as np
+import streamlit as st
+from .mask import decode_mask, mask_to_rle
+
+RecordKind = Literal["detection", "segmentation", "annotation"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    image_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    updated REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (image_id, kind)
+) WITHOUT ROWID
+"""
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class AnnotationStore:
+    """
+    Persistent annotations of a project, one record per image and kind of component, in an SQLite database.
+
+    Records are read one at a time by image id through the primary key index, so resuming a project
+    does not depend on its size. Writes are buffered and committed together in one transaction once
+    `batch_size` records are pending or `flush_interval` seconds after the first of them, whichever
+    comes first; reads see pending records. The store is thread-safe and can be shared by all sessions,
+    e.g. through `st.cache_resource`.
+
+    Passed as `store` to `detection()`, `segmentation()` or `annotation()`, it provides their initial
+    annotations when none are given and records every new value they return. Records are dicts:
+        detection:    {'bboxes': [[float]], 'bbox_format': str, 'bbox_ids': [str], 'labels': [int],
+                       'label_names': [str], 'meta_data': [[str]], 'info_dict': [dict], 'image_size': [int, int]}
+        segmentation: {'masks': [RLE dict], 'mask_size': [int, int], 'mask_ids': [str], 'labels': [int],
+                       'label_names': [str], 'meta_data': [[str]], 'info_dict': [dict], 'image_size': [int, int]}
+        annotation:   {'label': Union[str, [str]], 'meta': [str]}
+
+    Args:
+    path (str): Path to the database file, created if it does not exist.
+    batch_size (int, optional): Number of pending records that triggers a commit.
+    flush_interval (float, optional): Maximum time in seconds a record stays pending before it is committed.
+        Pending records are also committed by `flush()` and `close()`.
+    """
+
+    def __init__(self, path: str, batch_size: int = 64, flush_interval: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._pending: Dict[Tuple[str, str], Optional[str]] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets other processes read the project while it is being labeled
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+
+    def get(self, image_id: str, kind: RecordKind) -> Optional[dict]:
+        """Return the record of `kind` for `image_id`, or None if there is none."""
+        record_key = (str(image_id), kind)
+        with self._lock:
+            if record_key in self._pending:
+                data = self._pending[record_key]
+            else:
+                row = self._conn.execute(
+                    "SELECT data FROM annotations WHERE image_id = ? AND kind = ?", record_key
+                ).fetchone()
+                data = row[0] if row else None
+        return json.loads(data) if data is not None else None
+
+    def put(self, image_id: str, kind: RecordKind, record: dict) -> None:
+        """Store `record` as the record of `kind` for `image_id`, replacing any previous one."""
+        self._queue((str(image_id), kind), json.dumps(record, default=_json_default))
+
+    def delete(self, image_id: str, kind: RecordKind) -> None:
+        """Remove the record of `kind` for `image_id`, if any."""
+        self._queue((str(image_id), kind), None)
+
+    def flush(self) -> None:
+        """Commit all pending writes in one transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            now = time.time()
+            updates = [(*key, now, data) for key, data in self._pending.items() if data is not None]
+            deletes = [key for key, data in self._pending.items() if data is None]
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO annotations (image_id, kind, updated, data) VALUES (?, ?, ?, ?)", updates
+                )
+                self._conn.executemany("DELETE FROM annotations WHERE image_id = ? AND kind = ?", deletes)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._pending.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def image_ids(self, kind: Optional[RecordKind] = None) -> Iterator[str]:
+        """Iterate over the ids of the images with a record (of `kind`, if given), in order."""
+        self.flush()
+        query = "SELECT DISTINCT image_id FROM annotations"
+        params: tuple = ()
+        if kind is not None:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        # Streamed through a connection of its own, so that the store can be written to meanwhile
+        conn = sqlite3.connect(self.path)
+        try:
+            for (image_id,) in conn.execute(query + " ORDER BY image_id", params):
+                yield image_id
+        finally:
+            conn.close()
+
+    def count(self, kind: Optional[RecordKind] = None) -> int:
+        """Return the number of records (of `kind`, if given)."""
+        self.flush()
+        with self._lock:
+            if kind is None:
+                return self._conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM annotations WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def __contains__(self, image_id: str) -> bool:
+        self.flush()
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM annotations WHERE image_id = ? LIMIT 1", (str(image_id),))
+            return row.fetchone() is not None
+
+    def close(self) -> None:
+        """Commit pending writes and close the database."""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def __enter__(self) -> AnnotationStore:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _queue(self, record_key: Tuple[str, str], data: Optional[str]) -> None:
+        with self._lock:
+            self._pending[record_key] = data
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            elif self._timer is None:
+                # Not a daemon thread, so that pending records are committed before the interpreter exits
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.start()
+
+
+def record_id(image_path, image_id: Optional[str], digest: Optional[str]) -> Optional[str]:
+    """
+    Return the id under which the annotations of an image are stored: `image_id` if given, else the path
+    of the image file, else the identity of the image in memory.
+    """
+    if image_id is not None:
+        return str(image_id)
+    if isinstance(image_path, (str, os.PathLike)):
+        return os.fspath(image_path)
+    return digest
+
+
+def _record_labels(record: dict, label_list: list) -> list:
+    # Labels are matched by name, so that records survive changes to the order of `label_list`
+    names = record.get("label_names")
+    if names is not None and all(name in label_list for name in names):
+        return [label_list.index(name) for name in names]
+    return list(record["labels"])
+
+
+def _mask_record_masks(masks: list) -> list:
+    return [mask_to_rle(decode_mask(mask), compressed=True) for mask in masks]
+
+
+def _store_value(
+    store: AnnotationStore,
+    kind: RecordKind,
+    image_id: str,
+    value_key: int,
+    make_record: Callable[[], dict],
+    component_key,
+) -> None:
+    # A component keeps returning its last value after the image changes, so a value is written
+    # (to the image shown when it arrived) only once, when its key is first seen
+    state_key = f"_label_kit_store-{kind}-{component_key}"
+    if value_key == 0 or st.session_state.get(state_key) == value_key:
+        return
+    st.session_state[state_key] = value_key
+    store.put(image_id, kind, make_record())
@@ -0,0 +1,69 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+from __future__ import annotations
+from typing import Callable, Dict, Optional
+import streamlit as st
+from .store import RecordKind
+
+
+class SyncGroup:
+    """
+    Authoritative state of the components sharing a `sync_group` in a session.
+
+    Every member registers a decoder for its component value. Component values are in the session
+    state before the script runs, so whichever member is called first in a rerun applies the edit made
+    in any member, and all of them render the new state in that same rerun. `revision` counts the edits
+    and only ever increases; `record` is the state in the record format of `AnnotationStore`, or None
+    while the members show their inputs.
+    """
+
+    def __init__(self, kind: RecordKind):
+        self.kind = kind
+        self.revision = 0
+        self.record: Optional[dict] = None
+        self.key = 0                            # key of the component value the record was decoded from
+        self._decoders: Dict[object, Callable[[dict], dict]] = {}
+        self._seen: Dict[object, int] = {}      # latest value key applied, by member
+        self._bases: Dict[object, str] = {}     # digest of the inputs, by member
+
+    def update(self, member, base: str, decode: Callable[[dict], dict]) -> None:
+        """
+        Register `member` with its decoder for the current run, and apply the new values of all members.
+
+        Args:
+        member (any): Key of the member component.
+        base (str): Digest of the member's inputs. New inputs (e.g. the next image) replace the shared state.
+        decode (Callable): Converts a component value of the member into a record.
+        """
+        if self._bases.get(member, base) != base:
+            self.record = None
+        self._bases[member] = base
+        self._decoders[member] = decode
+
+        for key, member_decode in self._decoders.items():
+            value = st.session_state.get(key)
+            if not isinstance(value, dict) or "key" not in value:
+                continue
+            value_key = int(value["key"])
+            if value_key == 0 or self._seen.get(key) == value_key:
+                continue
+            self._seen[key] = value_key
+            self.record = member_decode(value)
+            self.key = value_key
+            self.revision += 1
+
+
+def join_sync_group(name: str, kind: RecordKind, member, base: str, decode: Callable[[dict], dict]) -> SyncGroup:
+    """Return the session's group `name`, after registering `member` and applying new values, see `SyncGroup`."""
+    if member is None:
+        raise ValueError("Components in a sync_group require a key")
+    group = st.session_state.setdefault(f"_label_kit_sync-{name}", SyncGroup(kind))
+    if group.kind != kind:
+        raise ValueError(f"sync_group {name!r} links {group.kind} components, not {kind}")
+    group.update(member, base, decode)
+    return group
@@ -0,0 +1,152 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+from __future__ import annotations
+import math
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from PIL import Image
+from .image_cache import ImageSource, _open_image, _save_image
+
+# Tiles are shared by all sessions and processes, and survive restarts
+DEFAULT_TILE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "streamlit-label-kit-tiles")
+
+_EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+# Decoded source images, by identity. Large images take a lot of memory, so only a few are kept.
+MAX_DECODED_SOURCES = 2
+_sources_lock = threading.Lock()
+_sources: "OrderedDict[str, Image.Image]" = OrderedDict()
+
+
+def _decoded_source(digest: str, image: ImageSource) -> Image.Image:
+    with _sources_lock:
+        source = _sources.get(digest)
+        if source is not None:
+            _sources.move_to_end(digest)
+            return source
+
+        with _open_image(image) as opened:
+            # Image.reduce does not support palette and bilevel images
+            if opened.mode in ("RGB", "RGBA", "L", "LA"):
+                opened.load()
+                source = opened
+            else:
+                source = opened.convert("RGBA" if "transparency" in opened.info else "RGB")
+
+        _sources[digest] = source
+        while len(_sources) > MAX_DECODED_SOURCES:
+            _sources.popitem(last=False)
+        return source
+
+
+class TilePyramid:
+    """
+    Multi-resolution tile pyramid of an image, generated lazily and cached on disk.
+
+    Level 0 is the image at full resolution and every further level halves it, up to the level
+    that fits in a single tile. Tiles are `tile_size` pixels square, smaller at the right and
+    bottom edges, and are only generated when first requested.
+
+    Args:
+    image (Union[str, PIL.Image.Image, np.ndarray, bytes, BinaryIO]): Path to the image file, or the image in memory.
+    digest (str): Identity of the image (see `image_identity`), naming its directory in the cache.
+    image_size (Tuple[int, int]): (width, height) of the image.
+    tile_size (int, optional): Width and height of a tile in pixels.
+    image_format (Literal["png", "jpeg", "webp"], optional): Format tiles are encoded in.
+    image_quality (int, optional): JPEG/WebP quality (1-100), ignored for PNG.
+    cache_dir (str, optional): Directory tiles are stored in. Defaults to `DEFAULT_TILE_CACHE_DIR`.
+    """
+
+    def __init__(
+        self,
+        image: ImageSource,
+        digest: str,
+        image_size: Tuple[int, int],
+        tile_size: int = 256,
+        image_format: str = "jpeg",
+        image_quality: int = 85,
+        cache_dir: Optional[str] = None,
+    ):
+        self.image = image
+        self.digest = digest
+        self.width, self.height = image_size
+        self.tile_size = tile_size
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.directory = os.path.join(
+            cache_dir or DEFAULT_TILE_CACHE_DIR, digest, f"{tile_size}-{image_format}-{image_quality}"
+        )
+        self.levels = max(1, math.ceil(math.log2(max(self.width, self.height) / tile_size)) + 1)
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        """Return the (width, height) of the image at `level`."""
+        factor = 1 << level
+        return (-(-self.width // factor), -(-self.height // factor))
+
+    def grid_size(self, level: int) -> Tuple[int, int]:
+        """Return the number of (columns, rows) of tiles at `level`."""
+        width, height = self.level_size(level)
+        return (-(-width // self.tile_size), -(-height // self.tile_size))
+
+    def tile_path(self, level: int, col: int, row: int) -> str:
+        return os.path.join(self.directory, str(level), f"{col}_{row}.{_EXTENSIONS[self.image_format]}")
+
+    def tile(self, level: int, col: int, row: int) -> bytes:
+        """
+        Return the encoded tile at (`col`, `row`) of `level`, generating it if it is not cached yet.
+        """
+        cols, rows = self.grid_size(level) if 0 <= level < self.levels else (0, 0)
+        if not (0 <= col < cols and 0 <= row < rows):
+            raise ValueError(f"No tile {level}/{col}/{row} in a pyramid of {self.levels} levels")
+
+        path = self.tile_path(level, col, row)
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+
+        data = self._render(level, col, row)
+
+        # Written under a unique name and renamed, so that concurrent sessions never read a partial tile
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return data
+
+    def tiles(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Return the encoded tiles for keys of the form "level/col/row", skipping invalid keys.
+        """
+        tiles = {}
+        for key in keys:
+            try:
+                level, col, row = (int(v) for v in key.split("/"))
+                tiles[key] = self.tile(level, col, row)
+            except ValueError:
+                continue
+        return tiles
+
+    def _render(self, level: int, col: int, row: int) -> bytes:
+        factor = 1 << level
+        span = self.tile_size * factor
+        box = (
+            col * span,
+            row * span,
+            min(self.width, (col + 1) * span),
+            min(self.height, (row + 1) * span),
+        )
+        tile = _decoded_source(self.digest, self.image).crop(box)
+        if factor > 1:
+            tile = tile.reduce(factor)
+        return _save_image(tile, self.image_format, self.image_quality)
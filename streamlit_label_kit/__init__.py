@@ -5,9 +5,15 @@
 # SPDX-License-Identifier: GPL-2.0-only
 #
 
-from .LabelToolKit import convert_bbox_format, absolute_to_relative, relative_to_absolute
+from .LabelToolKit import convert_bbox_format, absolute_to_relative, relative_to_absolute, convert_bboxes, absolute_to_relative_bboxes, relative_to_absolute_bboxes
 from .LabelToolKit.detection import detection
 from .LabelToolKit.annotation import annotation
 from .LabelToolKit.segmentation import segmentation
+from .LabelToolKit.image_cache import ImageCache, image_cache, preload_images
+from .LabelToolKit.dataset import LabelDataset
+from .LabelToolKit.store import AnnotationStore
+from .LabelToolKit.formats import LabeledImage, read_coco, write_coco, read_yolo, write_yolo, read_voc, write_voc, import_annotations, stored_images
+from .LabelToolKit.colormap import get_colormap
+from .LabelToolKit.mask import mask_to_rle, rle_to_mask, mask_to_packbits, packbits_to_mask, encode_mask, decode_mask, encode_masks, decode_masks, resize_mask, resolve_overlaps
 
 __version__ = "0.1.3"
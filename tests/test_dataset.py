@@ -0,0 +1,42 @@
+#
+# Streamlit components for general labeling tasks
+#
+# Copyright (c) 2024 Carnegie Mellon University
+# SPDX-License-Identifier: GPL-2.0-only
+#
+
+import threading
+from concurrent.futures import Future
+from streamlit_label_kit import LabelDataset
+
+
+class ImmediateExecutor:
+    # Runs each task in the calling thread, so its future is done before any callback is added
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class InstantDataset(LabelDataset):
+    def _load(self, index: int) -> None:
+        pass
+
+
+def test_image_args_with_loads_done_before_their_callbacks():
+    dataset = InstantDataset(["a.jpg", "b.jpg", "c.jpg"], prefetch=1)
+    dataset._executor.shutdown()
+    dataset._executor = ImmediateExecutor()
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(dataset.image_args(1)), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive(), "image_args() deadlocked"
+    assert result["image"] == "b.jpg"
+    assert dataset._loading == {}
+    dataset.close()